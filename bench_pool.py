@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+'''
+
+bench_pool.py - Compare allocation churn and GC time with and without
+an AgentPool.
+
+For each mode this runs the standard setup_sim() world with automatic
+garbage collection turned off and reports:
+
+    allocs/step - net GC-tracked objects allocated per step (from the
+                  generation 0 count, which is allocations minus
+                  deallocations between collections)
+    npcs/step   - new NPC objects made per step
+    gc ms/step  - time spent in an explicit gc.collect() every few steps
+    steps/s     - overall step rate
+
+'''
+import gc
+import random
+import sys
+import time
+
+import sbonu
+import spores
+
+
+def bench(pool, steps=300, seed=1, collect_every=10):
+    sbonu.NPC.pool = pool
+    random.seed(seed)
+    Alice, S, sim = sbonu.setup_sim()
+
+    gc.collect()
+    gc.disable()
+    allocs = 0
+    gc_time = 0.0
+    first_id = next(spores._ids)
+    start = time.time()
+    try:
+        for n in xrange(1, steps + 1):
+            before = gc.get_count()[0]
+            sim.step()
+            allocs += gc.get_count()[0] - before
+            if not n % collect_every:
+                t = time.time()
+                gc.collect()
+                gc_time += time.time() - t
+    finally:
+        gc.enable()
+        sbonu.NPC.pool = None
+    elapsed = time.time() - start
+
+    if pool:
+        npcs = pool.created
+    else:
+        npcs = next(spores._ids) - first_id - 1
+    return (
+        float(allocs) / steps,
+        float(npcs) / steps,
+        gc_time * 1000 / steps,
+        steps / elapsed,
+        )
+
+
+def main(steps=300):
+    print '%-8s %11s %10s %11s %9s' % (
+        'mode', 'allocs/step', 'npcs/step', 'gc ms/step', 'steps/s')
+    for name, pool in (('plain', None), ('pool', sbonu.AgentPool())):
+        print '%-8s %11.1f %10.2f %11.3f %9.1f' % (
+            (name,) + bench(pool, steps))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,195 @@
+'''
+
+cache.py - On-disk cache of completed simulation runs.
+
+A run is identified by the setup_sim() parameters, the spore class
+parameters, the random seed, the number of steps (and the rule that
+stopped it early, for sweeps) and a hash of the simulation source code, so editing the code invalidates old results.
+The cache holds the per-step getStats() series of each run and evicts
+the least recently used runs once it grows past max_bytes.
+
+'''
+import os
+import random
+import tempfile
+import cPickle as pickle
+from hashlib import sha1
+from inspect import getargspec, getmro
+from types import ClassType, FunctionType
+
+import kernels
+import sbonu
+import space
+import spores
+import sweep
+
+
+# Modules whose source makes up the "code version" of a run.
+SOURCE_MODULES = (sbonu, space, spores, kernels, sweep)
+
+
+def sourceHash(modules=SOURCE_MODULES):
+    '''
+    Return a hex digest of the source code of modules.
+    '''
+    digest = sha1()
+    for module in modules:
+        filename = module.__file__
+        if filename.endswith(('.pyc', '.pyo')):
+            filename = filename[:-1]
+        with open(filename, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def sporeParams(spore_class):
+    '''
+    Return a sorted list of the (name, value) class attributes, such as
+    virulence, that parameterize spore_class.
+    '''
+    params = {}
+    for cls in reversed(getmro(spore_class)):
+        for name, value in vars(cls).items():
+            if not name.startswith('_') and not callable(value):
+                params[name] = value
+    return sorted(params.items())
+
+
+def stableParam(value):
+    '''
+    Return value in a form whose repr() is the same in every process:
+    classes and functions become 'module.name'.  Raise TypeError for
+    values, such as instances or lambdas, that have no such form.
+    '''
+    if value is None or isinstance(value, (bool, int, long, float, basestring)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return type(value)(stableParam(item) for item in value)
+    if isinstance(value, dict):
+        return sorted(
+            (stableParam(k), stableParam(v)) for k, v in value.items())
+    if (isinstance(value, (type, ClassType, FunctionType))
+        and not value.__name__.startswith('<')):
+        return '%s.%s' % (value.__module__, value.__name__)
+    raise TypeError("can't key a run on %r" % (value,))
+
+
+def setupParams(**params):
+    '''
+    Return params filled in with the defaults of setup_sim().
+    '''
+    spec = getargspec(sbonu.setup_sim)
+    full = dict(zip(spec.args[-len(spec.defaults):], spec.defaults))
+    full.update(params)
+    return full
+
+
+class RunCache:
+    '''
+    Directory of pickled run results keyed by runKey().
+    '''
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._source = sourceHash()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def runKey(self, seed, steps, stop=None, **params):
+        '''
+        Return the cache key for a run of setup_sim(**params), stopped
+        early by the rule described by stop (None for run()'s own.)  (Runs
+        that setup_sim() would build the same way, such as with and
+        without a default spelled out, get the same key.)  Raise
+        TypeError if a parameter can't be keyed the same way in every
+        process.
+        '''
+        params = setupParams(**params)
+        spore_class = params.pop('spore_class')
+        spore_params = dict(sporeParams(spore_class))
+        virulence = params.pop('virulence')
+        if virulence is not None:
+            spore_params['virulence'] = virulence
+        key = (
+            stableParam(params),
+            stableParam(spore_class),
+            stableParam(spore_params),
+            seed,
+            steps,
+            stableParam(stop),
+            self._source,
+            )
+        return sha1(repr(key)).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.run')
+
+    def get(self, key):
+        '''
+        Return the cached series for key, or None.
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                series = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        os.utime(path, None) # Mark as recently used.
+        return series
+
+    def put(self, key, series):
+        '''
+        Store series under key, evicting old runs if needed.
+        '''
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(series, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp, self._path(key))
+        self.evict()
+
+    def evict(self):
+        '''
+        Delete least recently used runs until the cache fits max_bytes.
+        '''
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.run'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def run(self, seed, steps=500, **params):
+        '''
+        Return the stats series of setup_sim(**params) run with random
+        seeded by seed, from the cache if possible.
+        '''
+        key = self.runKey(seed, steps, **params)
+        series = self.get(key)
+        if series is not None:
+            return series
+
+        random.seed(seed)
+        Alice, S, sim = sbonu.setup_sim(**params)
+        series = sim.run(steps)
+        self.put(key, series)
+        return series
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+'''
+
+cli.py - One command line entry point for all the ways to run sbonu.
+
+    ./cli.py run [--steps N] [--seed S] [--save FILE] ...
+    ./cli.py sweep --virulence 0.01 0.05 ...
+    ./cli.py curses | tk | pygame
+    ./cli.py replay FILE
+    ./cli.py --profile FILE <subcommand> ...
+
+Only this module and argparse are loaded up front; each subcommand
+imports the simulation, the front end and their dependencies itself,
+so headless jobs never load curses, Tkinter or pygame.
+
+'''
+import argparse
+import sys
+
+
+STATUS = '%.02f %.02f %05i %-i'
+
+
+def _setupParams(args):
+    return dict(
+        dimension=args.dimension,
+        food_growth_rate=args.food_growth_rate,
+        number_of_npcs=args.npcs,
+        initial_food_cycles=args.initial_food_cycles,
+        )
+
+
+def run(args, out):
+    import random
+    import cPickle as pickle
+    from sbonu import setup_sim
+
+    random.seed(args.seed)
+    params = _setupParams(args)
+    Alice, S, sim = setup_sim(virulence=args.virulence, **params)
+
+    if args.metrics_port is not None:
+        from metrics import SimMetrics, MetricsServer
+        metrics = SimMetrics()
+        MetricsServer(metrics, args.metrics_port).start()
+        step = lambda: metrics.step(sim)
+    else:
+        metrics = None
+        step = sim.step
+
+    series = []
+    distributions = []
+    for n in xrange(args.steps):
+        step()
+        pop, infected, immune, fud = stats = sim.space.getStats()
+        series.append(stats)
+        if args.distributions:
+            distributions.append(sim.space.getDistributions())
+        if metrics:
+            metrics.observe(sim, stats)
+        print >> out, STATUS % (infected, immune, n, pop)
+        if infected + immune >= 1.0:
+            break
+
+    if args.save:
+        with open(args.save, 'wb') as f:
+            pickle.dump(series, f, pickle.HIGHEST_PROTOCOL)
+    if args.distributions:
+        with open(args.distributions, 'wb') as f:
+            pickle.dump(distributions, f, pickle.HIGHEST_PROTOCOL)
+
+
+def sweep(args, out):
+    from sweep import AdaptiveSweep
+    from cache import RunCache
+
+    params = _setupParams(args)
+    configs = [dict(params, virulence=v) for v in args.virulence]
+    s = AdaptiveSweep(
+        configs,
+        args.budget,
+        replicates=args.replicates,
+        max_steps=args.steps,
+        seed=args.seed,
+        cache=RunCache(args.cache) if args.cache else None,
+        )
+    s.run()
+    for config, (n, mean, variance) in zip(configs, s.summary()):
+        print >> out, '%g %i %.03f %.04f' % (
+            config['virulence'], n, mean, variance)
+
+
+def replay(args, out):
+    import cPickle as pickle
+
+    with open(args.file, 'rb') as f:
+        series = pickle.load(f)
+    for n, (pop, infected, immune, fud) in enumerate(series):
+        print >> out, STATUS % (infected, immune, n, pop)
+
+
+def front_end(module_name):
+    def command(args, out):
+        module = __import__(module_name)
+        module.main()
+    return command
+
+
+def parser():
+    p = argparse.ArgumentParser(description='Run the sbonu simulation.')
+    p.add_argument(
+        '--profile', metavar='FILE',
+        help='write sampled collapsed stacks (for flame graphs) to FILE')
+    p.add_argument('--profile-interval', type=float, default=0.005)
+    commands = p.add_subparsers()
+
+    def simArguments(sub):
+        sub.add_argument('--steps', type=int, default=500)
+        sub.add_argument('--seed', type=int, default=None)
+        sub.add_argument('--dimension', type=int, default=50)
+        sub.add_argument('--food-growth-rate', type=int, default=30)
+        sub.add_argument('--npcs', type=int, default=59)
+        sub.add_argument('--initial-food-cycles', type=int, default=3)
+
+    sub = commands.add_parser('run', help='headless run')
+    simArguments(sub)
+    sub.add_argument(
+        '--virulence', type=float, default=None,
+        help="default: the standard scenario's 0.05")
+    sub.add_argument('--save', help='pickle the stats series to this file')
+    sub.add_argument(
+        '--distributions', metavar='FILE',
+        help='pickle the per-step getDistributions() dicts to FILE')
+    sub.add_argument('--metrics-port', type=int, default=None)
+    sub.set_defaults(command=run)
+
+    sub = commands.add_parser('sweep', help='adaptive virulence sweep')
+    simArguments(sub)
+    sub.add_argument('--virulence', type=float, nargs='+', required=True)
+    sub.add_argument('--budget', type=int, default=10000)
+    sub.add_argument('--replicates', type=int, default=3)
+    sub.add_argument(
+        '--cache', metavar='DIR', help='reuse replicates cached in DIR')
+    sub.set_defaults(command=sweep)
+
+    for name, module_name in (
+        ('curses', 'curses_sbonu'),
+        ('tk', 'tk_sbonu'),
+        ('pygame', 'pg_sbonu'),
+        ):
+        sub = commands.add_parser(name, help='%s front end' % name)
+        sub.set_defaults(command=front_end(module_name))
+
+    sub = commands.add_parser('replay', help='print a saved run')
+    sub.add_argument('file')
+    sub.set_defaults(command=replay)
+
+    return p
+
+
+def main(argv=None, out=sys.stdout):
+    args = parser().parse_args(argv)
+    if args.profile:
+        from sampler import Sampler
+        with Sampler(args.profile, args.profile_interval):
+            args.command(args, out)
+    else:
+        args.command(args, out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''
+
+clusters.py - Incremental tracking of spatial clusters of infected people.
+
+Two infected people are in the same cluster if they're linked by a
+chain of infected people each within one cell (including diagonally) of
+the next, the same neighbourhood Space.within() gives.  A union-find
+structure over the infected people is updated as they enter, move and
+get infected, at near-constant cost per event.
+
+Union-find can join clusters but can't split them, so people who move
+apart (or who connected others and then leave) stay joined until the
+next rebuild, every rebuild_every steps.  Between rebuilds the counts
+are an upper bound on cluster sizes and a lower bound on their number.
+
+'''
+from itertools import product
+
+
+_NEIGHBOURHOOD = tuple(product((-1, 0, 1), repeat=2))
+
+
+class ClusterTracker:
+    '''
+    Track the clusters of infected people in space.
+    '''
+
+    def __init__(self, space, rebuild_every=10):
+        self.space = space
+        self.rebuild_every = rebuild_every
+        self.steps = 0
+        space.tracker = self
+        self.rebuild()
+
+    def rebuild(self):
+        '''
+        Recompute the clusters from scratch.
+        '''
+        self.parent = {}
+        self.size = {} # Number of present members, for roots.
+        self.present = set()
+        for person in self.space.yieldPeople():
+            self.placed(person)
+
+    def tick(self):
+        '''
+        Note the end of a step, rebuilding if it's time to.
+        '''
+        self.steps += 1
+        if not self.steps % self.rebuild_every:
+            self.rebuild()
+
+    def find(self, person):
+        parent = self.parent
+        while parent[person] is not person:
+            parent[person] = parent[parent[person]] # Path halving.
+            person = parent[person]
+        return person
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a is b:
+            return
+        size = self.size
+        if size[a] < size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        size[a] += size.pop(b)
+
+    def placed(self, person):
+        '''
+        Person has arrived somewhere (or been infected), join them to any
+        infected neighbours.
+        '''
+        if not person.infections:
+            return
+
+        if person not in self.parent:
+            self.parent[person] = person
+            self.size[person] = 0
+        if person not in self.present:
+            self.present.add(person)
+            self.size[self.find(person)] += 1
+
+        space = self.space
+        x, y = space.occupants[person].coords
+        for dx, dy in _NEIGHBOURHOOD:
+            location = space.get(x + dx, y + dy)
+            if not location:
+                continue
+            for other in location.occupants:
+                if other is not person and other in self.present:
+                    self.union(person, other)
+
+    def removed(self, person):
+        '''
+        Person is leaving the space.
+        '''
+        if person in self.present:
+            self.present.remove(person)
+            self.size[self.find(person)] -= 1
+
+    def stats(self):
+        '''
+        Return (number of clusters, size of the largest, {size: count}).
+        '''
+        histogram = {}
+        for size in self.size.itervalues():
+            if size:
+                histogram[size] = histogram.get(size, 0) + 1
+        clusters = sum(histogram.itervalues())
+        largest = max(histogram) if histogram else 0
+        return clusters, largest, histogram
@@ -1,65 +1,75 @@
 #!/usr/bin/env python
 import curses
-from time import sleep
+from time import sleep, time
 from sbonu import DIMENSION, setup_sim
 from space import _calories
 
-# Initialize curses
-_stdscr = curses.initscr()
-curses.start_color()
-curses.noecho()
-curses.cbreak()
-curses.curs_set(0)
-_stdscr.keypad(1)
-_stdscr.nodelay(1)
-
 # Initialize a bunch of colour pairs.
 BLACK_BLACK = 1
 RED_BLACK = 2
 GREEN_BLACK = 3
 BLUE_BLACK = 4
-curses.init_pair(BLACK_BLACK, curses.COLOR_BLACK, curses.COLOR_BLACK)
-curses.init_pair(RED_BLACK, curses.COLOR_RED, curses.COLOR_BLACK)
-curses.init_pair(GREEN_BLACK, curses.COLOR_GREEN, curses.COLOR_BLACK)
-curses.init_pair(BLUE_BLACK, curses.COLOR_BLUE, curses.COLOR_BLACK)
+
+# Longest time (in seconds) to spend stepping the simulation per frame.
+FRAME_BUDGET = 1.0/30
+
+# Set up by init_curses().
+_stdscr = None
+pad = None
+
+
+def init_curses():
+    '''
+    Initialize the terminal, the colour pairs and the pad.
+    '''
+    global _stdscr, pad
+    _stdscr = curses.initscr()
+    curses.start_color()
+    curses.noecho()
+    curses.cbreak()
+    curses.curs_set(0)
+    _stdscr.keypad(1)
+    _stdscr.nodelay(1)
+
+    curses.init_pair(BLACK_BLACK, curses.COLOR_BLACK, curses.COLOR_BLACK)
+    curses.init_pair(RED_BLACK, curses.COLOR_RED, curses.COLOR_BLACK)
+    curses.init_pair(GREEN_BLACK, curses.COLOR_GREEN, curses.COLOR_BLACK)
+    curses.init_pair(BLUE_BLACK, curses.COLOR_BLUE, curses.COLOR_BLACK)
+
+    pad = curses.newpad(DIMENSION + 1, DIMENSION + 1)
 
 
 def spaceToPad(space, pad):
-    for y in range(space.dim):
+    glyphs, colours = space.encodeFrame()
+    dim = space.dim
+    attributes = [colourAttribute(code) for code in range(5)]
+    for y in range(dim):
         pad.move(y, 0)
         pad.clrtoeol()
-        for x in range(space.dim):
-            L = space.get(x,y)
-            if L:
-                pad.addstr(y, x, str(L), colour(L))
+        row = y * dim
+        for x in range(dim):
+            glyph = glyphs[row + x]
+            if glyph != 32: # Not ' '
+                pad.addstr(y, x, chr(glyph), attributes[colours[row + x]])
 
 
-def colour(location):
+def colourAttribute(code):
     '''
-    Return a color_pair (possibly with attribute).
+    Return the color_pair (possibly with attribute) for a colour code from
+    Space.encodeFrame().
     '''
-    n = len(location.occupants)
-    if n:
-        if n == 1:
-            occ = location.occupants[0]
-            if occ.infections:
-                return curses.color_pair(BLUE_BLACK)
-            else:
-                return curses.color_pair(RED_BLACK)
-        elif n > 9:
-            return curses.color_pair(RED_BLACK)
-        else:
-            return curses.color_pair(RED_BLACK)
-    elif location.food:
-        return curses.color_pair(GREEN_BLACK)
-    return curses.color_pair(BLACK_BLACK) | curses.A_BOLD
-
-
-pad = curses.newpad(DIMENSION + 1, DIMENSION + 1)
+    if code == BLACK_BLACK:
+        return curses.color_pair(BLACK_BLACK) | curses.A_BOLD
+    return curses.color_pair(code)
 
 
 def onestep(generations, sim, display_y, display_x):
-    sim.step()
+    # If the step doesn't fit in a frame just keep the display alive, the
+    # step carries on where it left off next time round.
+    if not sim.step_until(time() + FRAME_BUDGET):
+        Y, X = _stdscr.getmaxyx()
+        pad.refresh(display_y, display_x,  0, 0,  Y-1, X-1)
+        return
 
     pop, infected, immune, fud = sim.space.getStats()
 
@@ -88,7 +98,6 @@ def onestep(generations, sim, display_y, display_x):
 
 
 def deinit_curses():
-    global _stdscr
     _stdscr.clear();
     _stdscr.move(0,0);
     curses.nocbreak()
@@ -102,6 +111,8 @@ def main():
 
     Alice, spawner, sim = setup_sim()
 
+    init_curses()
+
     step_delay = 1.0/23
 
     # Top left coordinates of section of space displayed.
@@ -109,8 +120,8 @@ def main():
     display_y = 0
 
     try:
-        for n in range(10000):
-            if onestep(n, sim, display_y, display_x):
+        while sim.steps < 10000:
+            if onestep(sim.steps, sim, display_y, display_x):
                 break
             else:
                 key = _stdscr.getch()
@@ -146,7 +157,7 @@ def main():
     print 'Virulence:', spawner.spore_class.virulence
     print 'Initial Population:', 60
     print 'Eventual Population:', pop
-    print 'Iterations:', n + 1
+    print 'Iterations:', sim.steps
     print 'Dimensions: %i x %i' % (DIMENSION, DIMENSION)
     print 'Total calories:', _calories
     print 'Average stored: %.01f' % (foods / pop,)
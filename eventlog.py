@@ -0,0 +1,142 @@
+'''
+
+eventlog.py - Compact append-only log of infection attempts.
+
+Each attempt is one fixed-width record:
+
+    step, source id, target id, genus id, success, tithe
+
+held column-wise in array buffers and written to disk a block at a time.
+On disk a block is a record count followed by each column's raw array
+bytes (native byte order), so a log of millions of events loads straight
+into NumPy arrays with load().
+
+Turn logging on with spores.setEventLog(TransmissionLog(path)); the
+source of an attempt is the most recent carrier in the spore's chain.
+Genus ids are as given by spores.genusId().
+
+'''
+import struct
+from array import array
+
+
+# Column name, array typecode.
+COLUMNS = (
+    ('step', 'i'),
+    ('source', 'i'),
+    ('target', 'i'),
+    ('genus', 'h'),
+    ('success', 'b'),
+    ('tithe', 'i'),
+    )
+
+_HEADER = struct.Struct('<I')
+
+
+class TransmissionLog:
+    '''
+    Buffer infection attempts and flush them to path in blocks of
+    block_size records.
+    '''
+
+    def __init__(self, path, block_size=65536):
+        self.path = path
+        self.block_size = block_size
+        self.file = open(path, 'ab')
+
+        # Current step, set by SbonuSimulation.step().
+        self.step = 0
+
+        # Total number of records, flushed or not.
+        self.count = 0
+
+        self._clear()
+
+    def _clear(self):
+        self.buffers = [array(code) for name, code in COLUMNS]
+        (
+            self._steps,
+            self._sources,
+            self._targets,
+            self._genera,
+            self._successes,
+            self._tithes,
+            ) = self.buffers
+
+    def record(self, spore, target, success, tithe):
+        '''
+        Record an attempt of spore to infect target.
+        '''
+        chain = spore.chain
+        source = chain[-1]() if chain else None
+        self._steps.append(self.step)
+        self._sources.append(source.id if source is not None else 0)
+        self._targets.append(target.id)
+        self._genera.append(spore.genus_id)
+        self._successes.append(bool(success))
+        self._tithes.append(tithe or 0)
+        self.count += 1
+        if len(self._steps) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write buffered records to disk as one block.
+        '''
+        n = len(self._steps)
+        if not n:
+            return
+        self.file.write(_HEADER.pack(n))
+        for buffer in self.buffers:
+            buffer.tofile(self.file)
+        self.file.flush()
+        self._clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def _readBlocks(path):
+    # Yield a list of column arrays for each block in the log at path.
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_HEADER.size)
+            if not header:
+                break
+            n, = _HEADER.unpack(header)
+            columns = []
+            for name, code in COLUMNS:
+                column = array(code)
+                column.fromfile(f, n)
+                columns.append(column)
+            yield columns
+
+
+def iterRecords(path):
+    '''
+    Yield each record in the log at path as a tuple.
+    '''
+    for columns in _readBlocks(path):
+        for record in zip(*columns):
+            yield record
+
+
+def load(path):
+    '''
+    Return a dict mapping column name to a NumPy array of the whole log
+    at path.
+    '''
+    import numpy
+
+    blocks = {}
+    for columns in _readBlocks(path):
+        for (name, code), column in zip(COLUMNS, columns):
+            blocks.setdefault(name, []).append(
+                numpy.frombuffer(column, dtype=column.typecode))
+
+    return dict(
+        (name, numpy.concatenate(blocks[name]) if name in blocks
+               else numpy.zeros(0, dtype=code))
+        for name, code in COLUMNS
+        )
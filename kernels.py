@@ -0,0 +1,75 @@
+'''
+
+kernels.py - Tight numeric loops over the array-backed state of a
+ChunkedSpace.
+
+If numba is installed the kernels are also available JIT-compiled, see
+backend().  Otherwise everything falls back to the plain Python versions,
+which give identical results (just slower.)
+
+'''
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+HAVE_NUMBA = numba is not None
+
+
+def scan_box(cells_a, cells_b, size, x0, x1, y0, y1, out):
+    '''
+    Write into out the index of every cell of a size x size chunk, with
+    local coordinates in the box x0..x1, y0..y1 (inclusive), that is
+    non-zero in cells_a or cells_b.  Return the number of indices
+    written.  (Indices are x * size + y, in increasing order.)
+    '''
+    n = 0
+    for x in range(x0, x1 + 1):
+        row = x * size
+        for y in range(y0, y1 + 1):
+            index = row + y
+            if cells_a[index] or cells_b[index]:
+                out[n] = index
+                n += 1
+    return n
+
+
+class Backend(object):
+    '''
+    A set of kernels, see backend().
+    '''
+
+    def __init__(self, name, compile=None):
+        self.name = name
+        for kernel in (scan_box,):
+            if compile:
+                kernel = compile(kernel)
+            setattr(self, kernel.__name__, kernel)
+
+
+_backends = {}
+
+
+def backend(name=None):
+    '''
+    Return the kernels for backend name, 'python' or 'numba'.  The
+    default (None) is 'numba' when it's available.  Asking for 'numba'
+    without numba installed gives the 'python' kernels.
+    '''
+    if name is None or name == 'numba':
+        name = 'numba' if HAVE_NUMBA else 'python'
+    elif name != 'python':
+        raise ValueError('Unknown kernel backend: %r' % (name,))
+
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+
+    if name == 'numba':
+        kernels = Backend(name, numba.njit(cache=True))
+    else:
+        kernels = Backend(name)
+    _backends[name] = kernels
+    return kernels
@@ -0,0 +1,131 @@
+'''
+
+memtrace.py - Memory growth tracing for long runs.
+
+MemoryTracer steps a simulation and, every interval steps, writes to a
+log file:
+
+    - process RSS,
+    - counts of NPC, Location, Food, Spore and weakref objects (and the
+      change since the last sample),
+    - the sizes of Space.occupants and the Location store,
+    - with tracemalloc available (Python 3, or the pytracemalloc
+      backport), the top allocation sites by growth since the last
+      snapshot.
+
+Sampling walks every object the garbage collector knows about, so the
+interval is what sets the overhead.
+
+'''
+import gc
+import time
+from weakref import ref
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import sbonu
+import space
+import spores
+from metrics import rss
+
+
+WATCHED = (
+    ('NPC', sbonu.NPC),
+    ('Location', space.Location),
+    ('Food', space.Food),
+    ('Spore', spores.Spore),
+    ('weakref', ref),
+    )
+
+
+def countObjects(watched=WATCHED):
+    '''
+    Return a dict mapping each watched name to the number of live
+    instances of the matching class.
+    '''
+    counts = dict.fromkeys([name for name, cls in watched], 0)
+    for obj in gc.get_objects():
+        for name, cls in watched:
+            if isinstance(obj, cls):
+                counts[name] += 1
+                break
+    return counts
+
+
+class MemoryTracer:
+    '''
+    Step a simulation, logging memory use every interval steps to
+    logfile (a path or an open file.)
+    '''
+
+    def __init__(self, logfile, interval=100, top=10, frames=1):
+        if isinstance(logfile, basestring):
+            logfile = open(logfile, 'a')
+        self.log = logfile
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+        self.steps = 0
+        self._counts = None
+        self._snapshot = None
+
+    def start(self):
+        if tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        return self
+
+    def stop(self):
+        if tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.log.flush()
+
+    def step(self, sim):
+        '''
+        Run sim.step(), sampling if it's time to.
+        '''
+        sim.step()
+        self.steps += 1
+        if not self.steps % self.interval:
+            self.sample(sim)
+
+    def run(self, sim, steps):
+        '''
+        Step sim steps times, sampling every interval steps.
+        '''
+        self.start()
+        try:
+            for _ in xrange(steps):
+                self.step(sim)
+        finally:
+            self.stop()
+
+    def sample(self, sim):
+        '''
+        Write one sample of sim's memory use to the log.
+        '''
+        write = self.log.write
+        write('step %i time %.3f rss %i\n' % (self.steps, time.time(), rss()))
+        write('  occupants %i locations %i\n' % (
+            len(sim.space.occupants), sim.space.countLocations()))
+
+        counts = countObjects()
+        last = self._counts or {}
+        for name, cls in WATCHED:
+            write('  %-9s %8i %+8i\n' % (
+                name, counts[name], counts[name] - last.get(name, 0)))
+        self._counts = counts
+
+        if tracemalloc and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            if self._snapshot is None:
+                stats = snapshot.statistics('lineno')
+            else:
+                stats = snapshot.compare_to(self._snapshot, 'lineno')
+            for stat in stats[:self.top]:
+                write('  %s\n' % (stat,))
+            self._snapshot = snapshot
+
+        self.log.flush()
@@ -0,0 +1,156 @@
+'''
+
+metrics.py - Live metrics for long-running simulations.
+
+SimMetrics collects counters as the simulation runs and MetricsServer
+serves them in Prometheus text format from a background thread:
+
+    metrics = SimMetrics()
+    server = MetricsServer(metrics, 8000).start()
+    while ...:
+        metrics.step(sim)
+        metrics.observe(sim)
+
+The simulation thread only ever appends a latency and swaps in a new
+snapshot dict; the server thread formats from those, so scraping never
+blocks or slows down SbonuSimulation.step().
+
+'''
+import os
+import resource
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import deque
+
+import space
+
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def rss():
+    '''
+    Return the resident set size of this process in bytes.
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        # Peak, not current, but better than nothing.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def quantile(values, q):
+    '''
+    Return the q quantile of the sorted list values.
+    '''
+    if not values:
+        return 0.0
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class SimMetrics:
+    '''
+    Step latencies and the latest simulation counters.
+    '''
+
+    def __init__(self, window=1000):
+        self.started = time.time()
+        self.steps = 0
+        self.latencies = deque(maxlen=window)
+        self.snapshot = {}
+
+    def step(self, sim):
+        '''
+        Run and time one sim.step(), return the latency in seconds.
+        '''
+        start = time.time()
+        sim.step()
+        latency = time.time() - start
+        self.latencies.append(latency)
+        self.steps += 1
+        return latency
+
+    def observe(self, sim, stats=None):
+        '''
+        Publish the state of sim.  Pass stats if you already have the
+        result of sim.space.getStats() to hand.
+        '''
+        if stats is None:
+            stats = sim.space.getStats()
+        pop, infected, immune, fud = stats
+        self.snapshot = {
+            'population': pop,
+            'infected_fraction': infected,
+            'immune_fraction': immune,
+            'food': fud,
+            'calories_total': space._calories,
+            'locations': sim.space.countLocations(),
+            }
+
+    def render(self):
+        '''
+        Return the metrics in Prometheus text format.
+        '''
+        latencies = sorted(self.latencies) # Atomic under the GIL.
+        snapshot = self.snapshot
+        elapsed = time.time() - self.started
+
+        lines = [
+            '# TYPE sbonu_steps_total counter',
+            'sbonu_steps_total %d' % self.steps,
+            '# TYPE sbonu_step_rate gauge',
+            'sbonu_step_rate %g' % (self.steps / elapsed if elapsed else 0.0),
+            '# TYPE sbonu_step_latency_seconds summary',
+            ]
+        for q in QUANTILES:
+            lines.append('sbonu_step_latency_seconds{quantile="%g"} %g' % (
+                q, quantile(latencies, q)))
+        lines.append('sbonu_step_latency_seconds_count %d' % len(latencies))
+
+        for name in sorted(snapshot):
+            kind = 'counter' if name.endswith('_total') else 'gauge'
+            lines.append('# TYPE sbonu_%s %s' % (name, kind))
+            lines.append('sbonu_%s %g' % (name, snapshot[name]))
+
+        lines.append('# TYPE process_resident_memory_bytes gauge')
+        lines.append('process_resident_memory_bytes %d' % rss())
+        return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = self.server.metrics.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep scrapes out of the simulation output.
+
+
+class MetricsServer:
+    '''
+    Serve metrics over HTTP on a daemon thread.  (Port 0 picks a free
+    port, see self.port.)
+    '''
+
+    def __init__(self, metrics, port=8000, host='127.0.0.1'):
+        self.httpd = HTTPServer((host, port), _Handler)
+        self.httpd.metrics = metrics
+        self.port = self.httpd.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
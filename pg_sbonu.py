@@ -16,15 +16,20 @@ bug_image_file = 'data/bug0.png'
 SCREEN_WIDTH, SCREEN_HEIGHT = SCREEN_DIMENSIONS = 800, 600 # 1024, 768
 
 
-screen = pygame.display.set_mode(SCREEN_DIMENSIONS, DOUBLEBUF)
-screen.fill(light_green)
+def main():
+    screen = pygame.display.set_mode(SCREEN_DIMENSIONS, DOUBLEBUF)
+    screen.fill(light_green)
 
-food_image = pygame.image.load(food_image_file)
-bug_image = pygame.image.load(bug_image_file)
+    food_image = pygame.image.load(food_image_file)
+    bug_image = pygame.image.load(bug_image_file)
 
-screen.blit(food_image, (133, 100))
-screen.blit(bug_image, (100, 90))
+    screen.blit(food_image, (133, 100))
+    screen.blit(bug_image, (100, 90))
 
-pygame.display.flip()
+    pygame.display.flip()
 
-raw_input('Press enter to quit..')
+    raw_input('Press enter to quit..')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+'''
+
+render.py - Headless rendering of Space states to PNG frames.
+
+A frame is a compact snapshot of a Space: one colour code per cell,
+from Space.encodeFrame(), using the same numbers as the curses colour
+pairs in curses_sbonu:
+
+    0 nothing there
+    1 empty Location
+    2 clean person, or a crowd
+    3 food
+    4 one infected person
+
+Frames are turned into RGB pixels with whole-array byte operations and
+written as PNGs by a pool of worker processes, so no display (and no
+imaging library, unless you want the sprites) is needed.
+
+'''
+import os
+import struct
+import zlib
+from multiprocessing import Pool
+
+from space import NOTHING, EMPTY, CLEAN, FOOD, INFECTED
+
+
+PALETTE = {
+    NOTHING: (0, 0, 0),
+    EMPTY: (40, 40, 40),
+    CLEAN: (205, 0, 0),
+    FOOD: (0, 205, 0),
+    INFECTED: (0, 0, 238),
+    }
+
+FOOD_SPRITE = 'data/spider_plant.png'
+BUG_SPRITE = 'data/bug0.png'
+
+
+def captureFrame(space):
+    '''
+    Return (dim, codes) where codes is a bytearray of the colour code of
+    each cell of space, indexed by y * dim + x.
+    '''
+    glyphs, colours = space.encodeFrame()
+    return space.dim, colours
+
+
+def _channelTables():
+    # One 256 byte translate() table per RGB channel.
+    tables = []
+    for channel in range(3):
+        table = bytearray(256)
+        for code, rgb in PALETTE.items():
+            table[code] = rgb[channel]
+        tables.append(bytes(table))
+    return tables
+
+_TABLES = _channelTables()
+
+
+def toRGB(frame, scale=1):
+    '''
+    Return (width, height, pixels) for frame, where pixels is a
+    bytearray of RGB rows with each cell scale x scale pixels.
+    '''
+    dim, codes = frame
+    width = dim * scale
+    codes = bytes(codes)
+
+    if scale > 1:
+        # Widen each row by repeating every cell scale times.
+        wide = bytearray(len(codes) * scale)
+        for k in range(scale):
+            wide[k::scale] = codes
+        codes = bytes(wide)
+
+    pixels = bytearray(len(codes) * 3)
+    for channel, table in enumerate(_TABLES):
+        pixels[channel::3] = codes.translate(table)
+
+    if scale > 1:
+        # Repeat every row scale times.
+        stride = width * 3
+        pixels = bytearray().join(
+            pixels[row:row + stride] * scale
+            for row in xrange(0, len(pixels), stride)
+            )
+
+    return width, dim * scale, pixels
+
+
+def _chunk(kind, data):
+    chunk = kind + data
+    return (
+        struct.pack('>I', len(data))
+        + chunk
+        + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+        )
+
+
+def encodePNG(width, height, pixels, level=6):
+    '''
+    Return the bytes of an 8-bit RGB PNG of pixels.
+    '''
+    stride = width * 3
+    raw = bytearray().join(
+        b'\x00' + pixels[row:row + stride] # Filter type 0 per row.
+        for row in xrange(0, height * stride, stride)
+        )
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + _chunk(b'IDAT', zlib.compress(bytes(raw), level))
+        + _chunk(b'IEND', b'')
+        )
+
+
+def _spriteFrame(frame, scale):
+    # Compose the food and bug sprites over the frame, needs PIL.
+    from PIL import Image
+
+    width, height, pixels = toRGB(frame, scale)
+    image = Image.frombytes('RGB', (width, height), bytes(pixels))
+    sprites = {}
+    for code, filename in ((FOOD, FOOD_SPRITE), (CLEAN, BUG_SPRITE), (INFECTED, BUG_SPRITE)):
+        sprite = Image.open(filename).convert('RGBA').resize((scale, scale))
+        sprites[code] = sprite
+
+    dim, codes = frame
+    for index, code in enumerate(codes):
+        sprite = sprites.get(code)
+        if sprite is not None:
+            y, x = divmod(index, dim)
+            image.paste(sprite, (x * scale, y * scale), sprite)
+
+    return width, height, bytearray(image.tobytes())
+
+
+def renderFrame(frame, scale=1, sprites=False):
+    '''
+    Return PNG bytes for frame.
+    '''
+    if sprites:
+        width, height, pixels = _spriteFrame(frame, scale)
+    else:
+        width, height, pixels = toRGB(frame, scale)
+    return encodePNG(width, height, pixels)
+
+
+def _renderJob(job):
+    path, frame, scale, sprites = job
+    with open(path, 'wb') as f:
+        f.write(renderFrame(frame, scale, sprites))
+    return path
+
+
+def renderFrames(
+    frames,
+    directory,
+    pattern='frame%05i.png',
+    scale=1,
+    sprites=False,
+    processes=None,
+    batch=64,
+    ):
+    '''
+    Render an iterable of frames to PNG files in directory, spreading
+    the encoding over a pool of processes.  Frames are handed out a
+    batch at a time so a long (or live) sequence is never all in memory.
+    Return the list of paths written.
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    pool = Pool(processes)
+    paths = []
+    try:
+        jobs = []
+        for n, frame in enumerate(frames):
+            path = os.path.join(directory, pattern % n)
+            jobs.append((path, frame, scale, sprites))
+            if len(jobs) >= batch:
+                paths.extend(pool.map(_renderJob, jobs))
+                jobs = []
+        if jobs:
+            paths.extend(pool.map(_renderJob, jobs))
+    finally:
+        pool.close()
+        pool.join()
+    return paths
+
+
+def recordFrames(sim, steps):
+    '''
+    Step sim up to steps times, yielding a frame after each step.
+    '''
+    for _ in xrange(steps):
+        sim.step()
+        yield captureFrame(sim.space)
@@ -0,0 +1,145 @@
+'''
+
+sampler.py - Low-overhead sampling profiler.
+
+Deterministic profiling (profile, cProfile) hooks every call, which
+badly distorts a simulation made of many small method calls.  Sampler
+instead looks at the running stack every interval seconds and counts
+how often each stack is seen, then writes the counts in the "collapsed
+stack" format flame graph tools read:
+
+    module.py:main;SbonuSimulation.step;NPC.program;Space.within 42
+
+Methods are labelled with the class that defines them, so a VIP_NPC
+running the inherited program() counts as NPC.program.
+
+    with Sampler('sbonu.folded'):
+        main()
+
+By default a background thread does the sampling; mode='signal' uses
+a SIGPROF interval timer instead (main thread only, Unix only), which
+only samples while the process is using CPU.
+
+'''
+import os
+import signal
+import sys
+import threading
+import time
+
+
+class Sampler:
+    '''
+    Sample the stack of the thread that calls start() every interval
+    seconds, writing collapsed stacks to path on stop().
+    '''
+
+    def __init__(self, path, interval=0.005, mode='thread'):
+        if mode not in ('thread', 'signal'):
+            raise ValueError('Unknown sampler mode: %r' % (mode,))
+        self.path = path
+        self.interval = interval
+        self.mode = mode
+        self.counts = {}
+        self.samples = 0
+        self._labels = {}
+        self._running = False
+        self._thread = None
+
+    def label(self, frame):
+        '''
+        Return a label for the function running in frame.
+        '''
+        code = frame.f_code
+        try:
+            return self._labels[code]
+        except KeyError:
+            pass
+
+        label = None
+        if code.co_argcount and code.co_varnames[0] == 'self':
+            obj = frame.f_locals.get('self')
+            cls = getattr(obj, '__class__', None)
+            for klass in _mro(cls):
+                func = klass.__dict__.get(code.co_name)
+                if getattr(func, 'func_code', None) is code:
+                    label = '%s.%s' % (klass.__name__, code.co_name)
+                    break
+        if label is None:
+            label = '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+
+        self._labels[code] = label
+        return label
+
+    def record(self, frame):
+        '''
+        Count one sample of the stack ending in frame.
+        '''
+        stack = []
+        while frame is not None:
+            stack.append(self.label(frame))
+            frame = frame.f_back
+        stack.reverse()
+        key = ';'.join(stack)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.samples += 1
+
+    def _sampleThread(self, ident):
+        while self._running:
+            frame = sys._current_frames().get(ident)
+            if frame is not None:
+                self.record(frame)
+            del frame
+            time.sleep(self.interval)
+
+    def _onSignal(self, signum, frame):
+        self.record(frame)
+
+    def start(self):
+        self._running = True
+        if self.mode == 'thread':
+            self._thread = threading.Thread(
+                target=self._sampleThread,
+                args=(threading.current_thread().ident,),
+                )
+            self._thread.daemon = True
+            self._thread.start()
+        else:
+            signal.signal(signal.SIGPROF, self._onSignal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def stop(self):
+        self._running = False
+        if self.mode == 'thread':
+            self._thread.join()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        self.write()
+
+    def write(self):
+        '''
+        Write the collapsed stacks to self.path.
+        '''
+        with open(self.path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write('%s %i\n' % (stack, count))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _mro(cls):
+    # Method resolution order for new and old-style classes.
+    if cls is None:
+        return []
+    if hasattr(cls, '__mro__'):
+        return cls.__mro__
+    order = [cls]
+    for base in cls.__bases__:
+        order.extend(_mro(base))
+    return order
@@ -1,7 +1,14 @@
 #!/usr/bin/env python
+import os
 import random
+import signal
+import traceback
+from array import array
+from time import time
+import cPickle as pickle
+from weakref import getweakrefcount
 from space import Space
-from spores import Spore, Spawner, Infectable
+from spores import Spore, Spawner, Infectable, getEventLog, getLedger
 
 # Width and height of the "map".
 DIMENSION = 50
@@ -20,15 +27,31 @@ class StarvationError(Exception):
     '''
 
 
+class ForkError(Exception):
+    '''
+    Raised by SbonuSimulation.fork() when a branch fails.
+    '''
+
+
 class NPC(Infectable):
 
     a = 100 # If I've had this much food
     b = 10 #  for this many turns
     #         then it's cool to reproduce.
 
+    # Optional AgentPool that clone() takes new NPCs from.
+    pool = None
+
     def __init__(self):
         Infectable.__init__(self)
 
+    def reset(self):
+        '''
+        Return self to the state of a newly made NPC.
+        '''
+        Infectable.reset(self)
+        self.__dict__.pop('turns_o_plenty', None)
+
     def reproduce(self):
         '''
         Clone self if conditions are right.
@@ -52,7 +75,7 @@ class NPC(Infectable):
         '''
         Create a clone of self.
         '''
-        clone = NPC()
+        clone = self.pool.acquire() if self.pool else NPC()
         clone.immunities.update(self.immunities)
         clone.infections[:] = [spore.spawn() for spore in self.infections]
         for spore in clone.infections:
@@ -120,6 +143,181 @@ class PC(NPC):
     pass
 
 
+class AgentPool:
+    '''
+    Recycles starved NPCs so that NPC.clone() can reuse them (and their
+    dicts and lists) instead of allocating new ones.  Opt in with:
+
+        NPC.pool = AgentPool()
+
+    Only plain NPCs that no spore chain has a weakref to are recycled,
+    anybody else is left to the garbage collector as before.  Reusing a
+    person that some chain still refers to would hand the tithes of a
+    dead lineage to whoever gets the recycled object.
+    '''
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.free = []
+        self.created = self.recycled = 0
+
+    def acquire(self):
+        '''
+        Return a fresh NPC, recycled if possible.
+        '''
+        if self.free:
+            self.recycled += 1
+            return self.free.pop()
+        self.created += 1
+        return NPC()
+
+    def release(self, person):
+        '''
+        Offer a person who has left the world for recycling, return a
+        bool indicating whether they were taken.
+        '''
+        if (person.__class__ is not NPC
+            or getweakrefcount(person)
+            or len(self.free) >= self.size):
+            return False
+        person.reset()
+        self.free.append(person)
+        return True
+
+
+class ActivityScheduler:
+    '''
+    Optional helper for SbonuSimulation.step() that sorts people into
+    activity classes (infected, near food, idle wanderer) as their turn
+    comes up.
+
+    Infected people and people with food in reach run their program()
+    as usual.  Idle wanderers (uninfected, nothing to eat in reach, and
+    running the stock NPC program) can only take one random step and pay
+    for it, so they take it directly: a handful of get()s instead of
+    eat(), yieldNearbyFoods() and the scan of the whole space in
+    within().
+
+    Everybody still takes their turn in the order of the plain loop in
+    SbonuSimulation._iterStep() and the random number stream is used in
+    exactly the same way, so a seeded run ends up in the same state with
+    or without the scheduler (see test_sbonu.py.)
+    '''
+
+    INFECTED = 'infected'
+    NEAR_FOOD = 'near food'
+    IDLE = 'idle'
+    OTHER = 'other'
+
+    def __init__(self):
+        self.counts = {}
+        self._plain = {}
+
+    def classify(self, space, person):
+        '''
+        Return the activity class of person.
+        '''
+        if person.infections:
+            return self.INFECTED
+        if not self._isPlain(person.__class__):
+            return self.OTHER
+        x, y = space.occupants[person].coords
+        for dx in _R:
+            for dy in _R:
+                location = space.get(x + dx, y + dy)
+                if location and location.food:
+                    return self.NEAR_FOOD
+        return self.IDLE
+
+    def _isPlain(self, cls):
+        # Does cls behave like NPC when it has nothing to eat?
+        try:
+            return self._plain[cls]
+        except KeyError:
+            pass
+        plain = self._plain[cls] = True not in (
+            getattr(cls, name).im_func is not getattr(NPC, name).im_func
+            for name in ('program', 'eat', 'wander', 'whichWay')
+            )
+        return plain
+
+    def step(self, sim):
+        '''
+        Run everybody in sim's space once.  (Doesn't generate() food.)
+        '''
+        for _ in self.iterStep(sim):
+            pass
+
+    def iterStep(self, sim):
+        '''
+        Generator version of step() that yields after each person.
+        '''
+        space = sim.space
+        counts = self.counts = dict.fromkeys(
+            (self.INFECTED, self.NEAR_FOOD, self.IDLE, self.OTHER), 0)
+
+        for person in space.yieldPeople():
+            activity = self.classify(space, person)
+            counts[activity] += 1
+            if activity is not self.IDLE:
+                sim.runProgram(person)
+
+            # What program() comes to with nothing to eat or infect:
+            # starve, or take a random step.
+            elif person.foods <= 0:
+                sim.starve(person)
+            else:
+                dx, dy = random.choice(_spots)
+                person.foods -= space.move(dx, dy, person)
+            yield
+
+
+def randomCoords(dimension, n):
+    '''
+    Return lists xs, ys of n random coordinates in a dimension x
+    dimension space.  (Generated with NumPy, seeded from random, when
+    it's available.)
+    '''
+    try:
+        import numpy
+    except ImportError:
+        randrange = random.randrange
+        xs = [randrange(dimension) for _ in xrange(n)]
+        ys = [randrange(dimension) for _ in xrange(n)]
+    else:
+        rng = numpy.random.RandomState(random.getrandbits(32))
+        xs = rng.randint(0, dimension, n).tolist()
+        ys = rng.randint(0, dimension, n).tolist()
+    return xs, ys
+
+
+# Stop predicates for SbonuSimulation.advance().  Each takes the space and
+# only looks at its maintained counters.
+
+def saturated(space):
+    '''
+    Everybody is infected or immune.
+    '''
+    return bool(space.occupants) and \
+        space.infected + space.immune >= len(space.occupants)
+
+
+def extinct(space):
+    '''
+    Nobody is left.
+    '''
+    return not space.occupants
+
+
+def populationBounds(low, high):
+    '''
+    Return a stop predicate for the population leaving low..high.
+    '''
+    def outside(space):
+        return not low <= len(space.occupants) <= high
+    return outside
+
+
 class SbonuSimulation:
 
     def __init__(
@@ -127,9 +325,18 @@ class SbonuSimulation:
         dimension,
         food_growth_rate,
         number_of_npcs,
-        initial_food_cycles=3
+        initial_food_cycles=3,
+        space_class=Space,
+        scheduler=None,
         ):
-        self.space = Space(dimension, food_growth_rate)
+        self.space = space_class(dimension, food_growth_rate)
+        self.scheduler = scheduler
+
+        # Number of completed steps.
+        self.steps = 0
+
+        # The unfinished step started by step_until(), if any.
+        self._pending = None
 
         random_coord = lambda : random.randint(0, dimension - 1)
 
@@ -141,23 +348,271 @@ class SbonuSimulation:
         for _ in range(initial_food_cycles):
             self.space.generate()
 
+    @classmethod
+    def fromArrays(
+        cls,
+        dimension,
+        food_growth_rate,
+        xs,
+        ys,
+        foods=None,
+        food_xs=(),
+        food_ys=(),
+        food_amounts=None,
+        **kw
+        ):
+        '''
+        Build a simulation in one pass from arrays: NPCs at xs, ys (with
+        foods energy each, if given) and food_amounts food (default one)
+        at food_xs, food_ys.  Other keyword arguments are as for
+        __init__().
+        '''
+        sim = cls(dimension, food_growth_rate, 0, 0, **kw)
+        NPCs = [NPC() for _ in xrange(len(xs))]
+        if foods is not None:
+            for person, amount in zip(NPCs, foods):
+                person.foods = amount
+        sim.space.bulkEnter(NPCs, xs, ys)
+        sim.space.bulkFood(food_xs, food_ys, food_amounts)
+        return sim
+
+    @classmethod
+    def bulk(
+        cls,
+        dimension,
+        food_growth_rate,
+        number_of_npcs,
+        initial_food_cycles=3,
+        **kw
+        ):
+        '''
+        Like SbonuSimulation(...) but much faster to start up for big
+        worlds: positions are generated in bulk and the initial food is
+        scattered uniformly at random, instead of growing around
+        existing food the way generate() does.
+        '''
+        xs, ys = randomCoords(dimension, number_of_npcs)
+        food_xs, food_ys = randomCoords(
+            dimension, food_growth_rate * initial_food_cycles)
+        return cls.fromArrays(
+            dimension, food_growth_rate, xs, ys,
+            food_xs=food_xs, food_ys=food_ys,
+            **kw)
+
     def step(self):
         '''
-        Simulation "step".  Run every NPC's program() once.
+        Simulation "step".  Run every NPC's program() once.  (Finishes
+        the step in progress if step_until() left one.)
         '''
-        # If there's anybody there, run their program.
-        for person in self.space.yieldPeople():
-            try:
-                person.program()
-            except StarvationError:
-                self.space.leave(person)
-                # This should be sufficient to cause the person to be
-                # garbage-collected.
+        self.step_until(None)
+
+    def step_until(self, deadline, batch=32):
+        '''
+        Work on the current step until time() passes deadline (checked
+        every batch people), return a bool indicating whether the step
+        was completed.  An unfinished step is picked up where it left off
+        by the next call, so a front end can keep to a frame budget no
+        matter how big the world is.  (A deadline of None means finish
+        the step.)  If the step raises, it's abandoned and the next call
+        starts a new one.
+        '''
+        if self._pending is None:
+            self._pending = self._iterStep()
+
+        n = 0
+        try:
+            for _ in self._pending:
+                n += 1
+                if deadline is not None and n >= batch:
+                    n = 0
+                    if time() >= deadline:
+                        return False
+        except BaseException:
+            self._pending = None
+            raise
+
+        self._pending = None
+        return True
+
+    def _iterStep(self):
+        # Generator doing one step, yields after each person.
+        log = getEventLog()
+        if log is not None:
+            log.step = self.steps
+
+        if self.scheduler:
+            for _ in self.scheduler.iterStep(self):
+                yield
+        else:
+            # If there's anybody there, run their program.
+            for person in self.space.yieldPeople():
+                self.runProgram(person)
+                yield
+
+        ledger = getLedger()
+        if ledger is not None:
+            ledger.settle()
+
         self.space.generate()
+        self.steps += 1
+
+        if self.space.tracker:
+            self.space.tracker.tick()
+
+    def advance(self, n, stop=saturated):
+        '''
+        Step up to n times, stopping early after a step where stop (a
+        predicate over the space, or a sequence of them, see saturated())
+        holds.  Return the population, infected, immune and food series
+        of the steps taken as four arrays of counts.
+        '''
+        if stop is None:
+            stop = ()
+        elif callable(stop):
+            stop = (stop,)
+
+        space = self.space
+        space.recount()
+        population = array('l')
+        infected = array('l')
+        immune = array('l')
+        food = array('l')
+
+        for _ in xrange(n):
+            self.step()
+            space = self.space
+            population.append(len(space.occupants))
+            infected.append(space.infected)
+            immune.append(space.immune)
+            food.append(space.food_total)
+            for predicate in stop:
+                if predicate(space):
+                    return population, infected, immune, food
+
+        return population, infected, immune, food
+
+    def run(self, steps=500):
+        '''
+        Step up to steps times, stopping early once everybody is
+        infected or immune.  Return the list of getStats() tuples.
+        '''
+        series = []
+        for N, infected, immune, fud in zip(*self.advance(steps)):
+            N = float(N)
+            if N:
+                series.append((N, infected / N, immune / N, fud))
+            else:
+                series.append((N, 0, 0, fud))
+        return series
+
+    def fork(self, n, mutate, steps=500, seed=None):
+        '''
+        Branch n scenarios off the current state of the simulation.
+
+        Each branch is a child process (made with os.fork() so it shares
+        the parent's memory copy-on-write) that calls mutate(sim, i),
+        reseeds random (with seed + i, or from the OS if seed is None),
+        runs the simulation and sends back the result of run(steps).
+        Return the list of results in branch order.
+        '''
+        children = []
+        try:
+            for i in range(n):
+                r, w = os.pipe()
+                pid = os.fork()
+                if not pid:
+                    os.close(r)
+                    self._branch(w, i, mutate, steps, seed)
+                os.close(w)
+                children.append((pid, os.fdopen(r, 'rb')))
+
+            # Hear from every branch before raising, so none are left
+            # running un-reaped.
+            messages = []
+            while children:
+                pid, f = children[0]
+                try:
+                    messages.append(pickle.load(f))
+                except EOFError:
+                    messages.append((False, 'branch exited without a result'))
+                f.close()
+                os.waitpid(pid, 0)
+                children.pop(0)
+        finally:
+            # Only left over if something went wrong in the parent.
+            for pid, f in children:
+                f.close()
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                os.waitpid(pid, 0)
+
+        for ok, result in messages:
+            if not ok:
+                raise ForkError(result)
+        return [result for ok, result in messages]
+
+    def _branch(self, w, i, mutate, steps, seed):
+        # Run in a forked child, never returns.
+        status = 1
+        try:
+            f = os.fdopen(w, 'wb')
+            try:
+                random.seed(None if seed is None else seed + i)
+                mutate(self, i)
+                message = True, self.run(steps)
+            except Exception:
+                message = False, traceback.format_exc()
+            pickle.dump(message, f, pickle.HIGHEST_PROTOCOL)
+            f.close()
+            status = 0
+        finally:
+            os._exit(status)
+
+    def runProgram(self, person):
+        '''
+        Run person's program(), removing them if they starve.
+        '''
+        try:
+            person.program()
+        except StarvationError:
+            self.starve(person)
+
+    def starve(self, person):
+        '''
+        Remove a starved person from the world.
+        '''
+        self.space.leave(person)
+        # This should be sufficient to cause the person to be
+        # garbage-collected, or recycled if there's a pool.
+        if NPC.pool:
+            NPC.pool.release(person)
 
 #########################################################################
 
-def setup_sim():
+class ScenarioSpore(Spore):
+    '''
+    The spore of the standard scenario.
+    '''
+    virulence = 0.05
+
+
+def setup_sim(
+    dimension=DIMENSION,
+    food_growth_rate=30,
+    number_of_npcs=59,
+    initial_food_cycles=3,
+    spore_class=ScenarioSpore,
+    virulence=None,
+    **kw
+    ):
+    '''
+    Return (Alice, Spawner, SbonuSimulation) for the standard scenario.
+    Alice's spores are a subclass of spore_class, with virulence if it's
+    given, otherwise spore_class's own.  Extra keyword arguments go to
+    SbonuSimulation().
+    '''
 
     class VIP_NPC(NPC):
         def reproduce(self):
@@ -165,18 +620,28 @@ def setup_sim():
 
     Alice = VIP_NPC()
 
-    class testSpore(Spore):
-        virulence = 0.05
+    class testSpore(spore_class):
+        pass
+    if virulence is not None:
+        testSpore.virulence = virulence
 
     S = Spawner('cats', Alice, testSpore)
 
-    sim = SbonuSimulation(DIMENSION, 30, 59)
-    sim.space.enter(DIMENSION/2, DIMENSION/2, Alice)
+    sim = SbonuSimulation(
+        dimension, food_growth_rate, number_of_npcs, initial_food_cycles, **kw)
+    sim.space.enter(dimension/2, dimension/2, Alice)
 
     return Alice, S, sim
 
 
-def main():
+def main(metrics_port=None):
+    if metrics_port is not None:
+        from metrics import SimMetrics, MetricsServer
+        metrics = SimMetrics()
+        MetricsServer(metrics, metrics_port).start()
+    else:
+        metrics = None
+
     try:
         from IPython.Shell import IPShellEmbed
     except ImportError:
@@ -190,8 +655,13 @@ def main():
     Alice, S, sim = setup_sim()
     try:
         for n in xrange(500):
-            sim.step()
-            pop, infected, immune, fud = sim.space.getStats()
+            if metrics:
+                metrics.step(sim)
+            else:
+                sim.step()
+            pop, infected, immune, fud = stats = sim.space.getStats()
+            if metrics:
+                metrics.observe(sim, stats)
             print "%.02f %.02f %05i %-i" % (infected, immune, n, pop)
             if infected + immune >= 1.0:
                 break
@@ -4,12 +4,21 @@ space.py - Encapsulates the world.  (Which is currently a 2D plane Toroid.
 
 '''
 import random
+from array import array
 from math import sqrt
+from bisect import bisect_right
+from spores import genusId, genusNames
+import kernels
 
 
 # Global count of all "food" that has been put in play.
 _calories = 0
 
+# Default getDistributions() food histogram bin edges and immunity
+# quantiles.
+FOOD_EDGES = (0, 25, 50, 100, 200, 400, 800)
+IMMUNITY_QUANTILES = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
 
 class Space:
     '''
@@ -23,6 +32,24 @@ class Space:
         self.space = {}
         self.occupants = {}
 
+        # Optional ClusterTracker (see clusters.py) kept informed of
+        # people arriving, leaving and getting infected.
+        self.tracker = None
+
+        # AggregateIndex behind the *Within() queries, made on first use
+        # and kept up to date from then on.
+        self.aggregates = None
+
+        # Counters kept up to date as people come, go and get infected
+        # and as food grows and is eaten, so that stop conditions can be
+        # checked without getStats().  (The population is just
+        # len(self.occupants).)  Immune is in the sense of getStats():
+        # fully immune to immune_genus and not infected.
+        self.immune_genus = 'cats'
+        self.infected = 0
+        self.immune = 0
+        self.food_total = 0
+
     def newLife(self, parent, child):
         '''
         A parent has brought a child into the world, take note.
@@ -31,13 +58,16 @@ class Space:
         location.enter(child)
         self.occupants[child] = location
         child.space = self
+        self._tally(child, 1)
+        if self.tracker:
+            self.tracker.placed(child)
 
     def yieldNeighbours(self, person, distance=1):
         '''
         Yield all neighbours within distance of person.
         '''
         location = self.occupants[person]
-        for place in location.getNearby(distance, Location.occupied):
+        for place in location.getNearby(distance, lambda n: n.occupied()):
             for other in place.occupants:
                 if other != person:
                     yield other
@@ -61,22 +91,21 @@ class Space:
         location = self.occupants[person]
 
         x, y = location.coords
-        x += dx; y += dy
 
         # Wrap at the borders.
-        while x >= self.dim: x -= self.dim
-        while x < 0: x += self.dim
-        while y >= self.dim: y -= self.dim
-        while y < 0: y += self.dim
+        x = (x + dx) % self.dim
+        y = (y + dy) % self.dim
 
-        new_location = self.getOrMake(x, y)
-
-        if new_location is location:
+        if (x, y) == location.coords:
             return
 
+        new_location = self.getOrMake(x, y)
+
         location.leave(person)
         new_location.enter(person)
         self.occupants[person] = new_location
+        if self.tracker:
+            self.tracker.placed(person)
 
         return int(round(sqrt(dx**2 + dy**2)))
 
@@ -95,15 +124,98 @@ class Space:
         location.enter(person)
         self.occupants[person] = location
         person.space = self
+        self._tally(person, 1)
+        if self.tracker:
+            self.tracker.placed(person)
+
+    def bulkEnter(self, people, xs, ys):
+        '''
+        Each person in people enters space at the matching x, y.
+        '''
+        occupants = self.occupants
+        for person, x, y in zip(people, xs, ys):
+            location = self.getOrMake(x, y)
+            location.enter(person)
+            occupants[person] = location
+            person.space = self
+            self._tally(person, 1)
+            if self.tracker:
+                self.tracker.placed(person)
+
+    def bulkFood(self, xs, ys, amounts=None):
+        '''
+        Add the matching amount of food (default one each) at each x, y.
+        '''
+        if amounts is None:
+            for x, y in zip(xs, ys):
+                self.getOrMake(x, y).addFood()
+        else:
+            for x, y, amount in zip(xs, ys, amounts):
+                if amount:
+                    self.getOrMake(x, y).addFood(amount)
 
     def leave(self, person):
         '''
         Person leaves space.
         '''
         location = self.occupants[person]
+        if self.tracker:
+            self.tracker.removed(person)
         location.leave(person)
         del self.occupants[person]
         person.space = None
+        self._tally(person, -1)
+
+    def noteInfection(self, person, spore=None, level=None):
+        '''
+        Person (in this space) has been infected, take note.  Pass the
+        spore and person's immunity to its genus from before the
+        infection, if known.
+        '''
+        if len(person.infections) == 1:
+            self.infected += 1
+            if spore is None or spore.genus != self.immune_genus:
+                level = self._immunity(person)
+            if level == 1:
+                self.immune -= 1
+        if self.tracker:
+            self.tracker.placed(person)
+
+    def noteResistance(self, person, spore):
+        '''
+        Person (in this space) has just become fully immune to the genus
+        of spore, take note.
+        '''
+        if spore.genus == self.immune_genus and not person.infections:
+            self.immune += 1
+
+    def _immunity(self, person):
+        # People without immunities (as in some tests) have none.
+        immunities = getattr(person, 'immunities', None)
+        return immunities.get(self.immune_genus) if immunities else None
+
+    def _tally(self, person, sign):
+        # Add (or with sign -1, remove) person to the counters.
+        if getattr(person, 'infections', None):
+            self.infected += sign
+        elif self._immunity(person) == 1:
+            self.immune += sign
+
+    def recount(self):
+        '''
+        Recompute the infected, immune and food_total counters (and
+        the AggregateIndex) from scratch, for after people or food have
+        been changed behind the space's back.
+        '''
+        self.aggregates = None
+        self.infected = self.immune = 0
+        for person in self.occupants:
+            self._tally(person, 1)
+        self.food_total = sum(
+            location.food.amount
+            for location in self._iterLocations()
+            if location.food
+            )
 
     def getOrMake(self, x, y):
         '''
@@ -180,6 +292,12 @@ class Space:
             else:
                 yield location
 
+    def countLocations(self):
+        '''
+        Return the number of Location objects currently stored.
+        '''
+        return len(self.space)
+
     def yieldPeople(self):
         '''
         Iterate through all the people in the space.
@@ -188,18 +306,212 @@ class Space:
             for person in location.occupants:
                 yield person
 
-    def __str__(self):
-        return '\n'.join(''.join(self._row(x)) for x in range(self.dim))
+    def densityGrid(self, level):
+        '''
+        Return a downsampled view of the space at zoom level: the space
+        is cut into square blocks 2**level cells on a side and this
+        returns (blocks, population, infected, food), where blocks is
+        the number of blocks along a side and the others are arrays,
+        indexed by bx * blocks + by, of the number of people, infected
+        people and food in each block.
+
+        This goes through the people one by one, but not the cells: at
+        levels where the blocks are at least AggregateIndex.BLOCK cells
+        across, the food comes from the AggregateIndex's block totals
+        (which the space then keeps up to date), so a zoomed out view
+        costs about the same however big the world is.
+        '''
+        blocks, population, infected, food = _emptyGrids(self.dim, level)
+
+        for person, location in self.occupants.iteritems():
+            x, y = location.coords
+            i = (x >> level) * blocks + (y >> level)
+            population[i] += 1
+            if person.infections:
+                infected[i] += 1
+
+        size = AggregateIndex.BLOCK
+        if (1 << level) >= size:
+            for (bx, by), block in self._aggregates().blocks.iteritems():
+                i = ((bx * size) >> level) * blocks + ((by * size) >> level)
+                food[i] += block[2 + AggregateIndex.FOOD]
+        else:
+            for (x, y), amount in self._foodCells():
+                food[(x >> level) * blocks + (y >> level)] += amount
 
-    def _row(self, x):
-        for y in range(self.dim):
-            L = self.get(x, y)
-            if L:
-                yield str(L)
+        return blocks, population, infected, food
+
+    def _aggregates(self):
+        if self.aggregates is None:
+            self.aggregates = AggregateIndex(self)
+        return self.aggregates
+
+    def _foodCells(self):
+        # Yield (coords, amount) for every location with food.
+        for coords, location in self.space.iteritems():
+            if location.food:
+                yield coords, location.food.amount
+
+    def noteFood(self, coords, amount):
+        '''
+        The food at coords has changed by amount, take note.
+        '''
+        self.food_total += amount
+        if self.aggregates is not None:
+            self.aggregates.add(coords, 0, amount)
+
+    def _segments(self, low, high):
+        # Split low..high inclusive, wrapped around the toroid, into
+        # non-wrapping (low, high) ranges.
+        dim = self.dim
+        if high < low:
+            return ()
+        if high - low + 1 >= dim:
+            return ((0, dim - 1),)
+        low %= dim
+        high %= dim
+        if low <= high:
+            return ((low, high),)
+        return ((low, dim - 1), (0, high))
+
+    def _boxSum(self, which, x, y, distance):
+        rectSum = self._aggregates().rectSum
+        total = 0
+        for x0, x1 in self._segments(x - distance, x + distance):
+            for y0, y1 in self._segments(y - distance, y + distance):
+                total += rectSum(which, x0, x1, y0, y1)
+        return total
+
+    def countWithin(self, x, y, distance):
+        '''
+        Return the number of people within distance of x, y (a square,
+        wrapping around the toroid.)
+        '''
+        return self._boxSum(AggregateIndex.COUNTS, x, y, distance)
+
+    def foodWithin(self, x, y, distance):
+        '''
+        Return the total food within distance of x, y (a square,
+        wrapping around the toroid.)
+        '''
+        return self._boxSum(AggregateIndex.FOOD, x, y, distance)
+
+    def sampleWithin(self, x, y, distance, exclude=None):
+        '''
+        Return a person chosen uniformly at random from those within
+        distance of x, y (wrapping around the toroid), other than
+        exclude, or None if there's nobody.
+        '''
+        rectSum = self._aggregates().rectSum
+        COUNTS = AggregateIndex.COUNTS
+        location = self.occupants.get(exclude)
+        skip_x, skip_y = location.coords if location else (-1, -1)
+
+        def count(x0, x1, y0, y1):
+            n = rectSum(COUNTS, x0, x1, y0, y1)
+            if x0 <= skip_x <= x1 and y0 <= skip_y <= y1:
+                n -= 1
+            return n
+
+        boxes = [
+            (x0, x1, y0, y1, count(x0, x1, y0, y1))
+            for x0, x1 in self._segments(x - distance, x + distance)
+            for y0, y1 in self._segments(y - distance, y + distance)
+            ]
+        total = sum(box[4] for box in boxes)
+        if not total:
+            return None
+
+        k = random.randrange(total)
+        for x0, x1, y0, y1, n in boxes:
+            if k < n:
+                break
+            k -= n
+
+        # Binary search for the row, then the cell, holding the k'th.
+        low, high = x0, x1
+        while low < high:
+            mid = (low + high) // 2
+            if k < count(x0, mid, y0, y1):
+                high = mid
+            else:
+                low = mid + 1
+        xx = low
+        if xx > x0:
+            k -= count(x0, xx - 1, y0, y1)
+        low, high = y0, y1
+        while low < high:
+            mid = (low + high) // 2
+            if k < count(xx, xx, y0, mid):
+                high = mid
             else:
-                yield ' '
+                low = mid + 1
+        yy = low
+        if yy > y0:
+            k -= count(xx, xx, y0, yy - 1)
+
+        occupants = [
+            person
+            for person in self.get(xx, yy).occupants
+            if person is not exclude
+            ]
+        return occupants[k]
+
+    def foodGradient(self, x, y, distance):
+        '''
+        Return (dx, dy), each -1, 0 or 1, pointing towards the side of
+        the square within distance of x, y with the most food.
+        '''
+        rectSum = self._aggregates().rectSum
+        FOOD = AggregateIndex.FOOD
+        def side(xs, ys):
+            total = 0
+            for x0, x1 in xs:
+                for y0, y1 in ys:
+                    total += rectSum(FOOD, x0, x1, y0, y1)
+            return total
+        xs = self._segments(x - distance, x + distance)
+        ys = self._segments(y - distance, y + distance)
+        dx = cmp(
+            side(self._segments(x + 1, x + distance), ys),
+            side(self._segments(x - distance, x - 1), ys),
+            )
+        dy = cmp(
+            side(xs, self._segments(y + 1, y + distance)),
+            side(xs, self._segments(y - distance, y - 1)),
+            )
+        return dx, dy
 
-    def getStats(self):
+    def encodeFrame(self):
+        '''
+        Return (glyphs, colours), two bytearrays holding the character
+        (as from str(location)) and colour code (see _colour()) of every
+        cell, indexed by y * dim + x.  Cells with no Location are ' '
+        with colour code NOTHING.
+        '''
+        dim = self.dim
+        glyphs = bytearray(b' ') * (dim * dim)
+        colours = bytearray(dim * dim)
+        for (x, y), location in self.space.iteritems():
+            index = y * dim + x
+            occupants = location.occupants
+            if occupants:
+                glyphs[index] = _glyph(occupants, None)
+                colours[index] = _colour(occupants, None)
+            elif location.food is not None:
+                glyphs[index] = 'f'
+                colours[index] = FOOD
+            else:
+                glyphs[index] = '.'
+                colours[index] = EMPTY
+        return glyphs, colours
+
+    def __str__(self):
+        glyphs, colours = self.encodeFrame()
+        dim = self.dim
+        return '\n'.join(str(glyphs[x::dim]) for x in range(dim))
+
+    def getStats(self, genus='cats'):
         POP = list(self.yieldPeople())
         N = float(len(POP))
 
@@ -215,12 +527,268 @@ class Space:
 
             infected = sum(1 for npc in POP if npc.infections) / N
 
-            f = lambda npc: not npc.infections and npc.immunities.get('cats')  == 1
+            f = lambda npc: not npc.infections and npc.immunities.get(genus) == 1
             immune = sum(1 for npc in POP if f(npc)) / N
 
         # Population, % infected, % immune
         return N, infected, immune, fud
 
+    def getGenusStats(self):
+        '''
+        Return population and a dict mapping each genus to (% infected,
+        % immune), computed in one pass over the people.  (Immune means
+        fully immune to the genus without being infected by it.)
+        '''
+        names = genusNames()
+        infected = [0] * len(names)
+        immune = [0] * len(names)
+        N = 0
+
+        for npc in self.yieldPeople():
+            N += 1
+            carried = set(spore.genus_id for spore in npc.infections)
+            for gid in carried:
+                infected[gid] += 1
+            for gid, level in enumerate(npc.immunities.levels):
+                if level == 1.0 and gid not in carried:
+                    immune[gid] += 1
+
+        N = float(N)
+        if not N:
+            return N, dict((genus, (0, 0)) for genus in names)
+        return N, dict(
+            (genus, (infected[gid] / N, immune[gid] / N))
+            for gid, genus in enumerate(names)
+            )
+
+    def getDistributions(
+        self,
+        genus='cats',
+        food_edges=FOOD_EDGES,
+        quantiles=IMMUNITY_QUANTILES,
+        ):
+        '''
+        Gather everybody's state into arrays in one pass and return a
+        dict of:
+
+            population  the number of people
+            foods       counts of people in each food_edges bin (below
+                        the second edge counts in the first bin, from
+                        the last edge up in the last)
+            immunity    the quantiles of immunity to genus
+            infections  infections[k] is the number of people carrying
+                        k infections
+            depths      depths[k] is the number of infections whose
+                        spore chain is k long
+
+        The reductions use NumPy when it's available.
+        '''
+        gid = genusId(genus)
+        foods = array('d')
+        immunity = array('d')
+        infections = array('l')
+        depths = array('l')
+
+        for npc in self.yieldPeople():
+            foods.append(npc.foods)
+            immunity.append(npc.immunities.level(gid))
+            infections.append(len(npc.infections))
+            depths.extend([len(spore.chain) for spore in npc.infections])
+
+        try:
+            import numpy
+        except ImportError:
+            reductions = _pythonReductions
+        else:
+            reductions = _numpyReductions(numpy)
+
+        histogram, quantile, bincount = reductions
+        return {
+            'population': len(foods),
+            'foods': histogram(foods, food_edges),
+            'immunity': quantile(immunity, quantiles),
+            'infections': bincount(infections),
+            'depths': bincount(depths),
+            }
+
+
+def _histogram(values, edges):
+    counts = array('l', [0]) * len(edges)
+    last = len(edges) - 1
+    for value in values:
+        counts[max(min(bisect_right(edges, value) - 1, last), 0)] += 1
+    return counts
+
+
+def _quantile(values, quantiles):
+    # Nearest rank, as in metrics.quantile().
+    values = sorted(values)
+    n = len(values)
+    if not n:
+        return array('d', [0.0]) * len(quantiles)
+    return array('d', [values[min(int(q * n), n - 1)] for q in quantiles])
+
+
+def _bincount(values):
+    counts = array('l', [0]) * (max(values) + 1 if values else 0)
+    for value in values:
+        counts[value] += 1
+    return counts
+
+
+_pythonReductions = _histogram, _quantile, _bincount
+
+
+def _numpyReductions(numpy):
+    # The same reductions as _pythonReductions, vectorized.
+
+    def histogram(values, edges):
+        values = numpy.frombuffer(values, dtype=values.typecode)
+        bins = numpy.searchsorted(numpy.asarray(edges), values, 'right') - 1
+        bins = numpy.clip(bins, 0, len(edges) - 1)
+        return array('l', numpy.bincount(bins, minlength=len(edges)).tolist())
+
+    def quantile(values, quantiles):
+        n = len(values)
+        if not n:
+            return array('d', [0.0]) * len(quantiles)
+        values = numpy.sort(numpy.frombuffer(values, dtype=values.typecode))
+        ranks = numpy.minimum((numpy.asarray(quantiles) * n).astype(int), n - 1)
+        return array('d', values[ranks].tolist())
+
+    def bincount(values):
+        if not len(values):
+            return array('l')
+        values = numpy.frombuffer(values, dtype=values.typecode)
+        return array('l', numpy.bincount(values).tolist())
+
+    return histogram, quantile, bincount
+
+
+def _emptyGrids(dim, level):
+    # Return blocks and three zeroed block arrays for densityGrid().
+    blocks = (dim + (1 << level) - 1) >> level
+    cells = blocks * blocks
+    return (
+        blocks,
+        array('l', [0]) * cells,
+        array('l', [0]) * cells,
+        array('l', [0]) * cells,
+        )
+
+
+class AggregateIndex(object):
+    '''
+    The occupant counts and food of a space, kept in a 2-D Fenwick tree
+    per BLOCK x BLOCK block so that summing any box costs O(log**2) per
+    block it touches.  The space keeps it up to date as people come, go
+    and move and food grows and is eaten, so queries always see the
+    world as it is.  Blocks are only allocated where there's somebody or
+    some food, so memory follows the occupied area, not the size of the
+    world.
+    '''
+
+    BLOCK = 32
+    COUNTS = 0
+    FOOD = 1
+
+    __slots__ = ('blocks',)
+
+    def __init__(self, space):
+        # (bx, by) -> [counts tree, food tree, people total, food total]
+        self.blocks = {}
+        for location in space.occupants.itervalues():
+            self.add(location.coords, 1, 0)
+        for coords, amount in space._foodCells():
+            self.add(coords, 0, amount)
+
+    def add(self, coords, people, food):
+        '''
+        Add people and food to the cell at coords.
+        '''
+        size = self.BLOCK
+        x, y = coords
+        key = x // size, y // size
+        block = self.blocks.get(key)
+        if block is None:
+            cells = size * size
+            block = self.blocks[key] = [
+                array('l', [0]) * cells, array('l', [0]) * cells, 0, 0]
+
+        for which, delta in ((self.COUNTS, people), (self.FOOD, food)):
+            if not delta:
+                continue
+            block[2 + which] += delta
+            tree = block[which]
+            i = x % size
+            while i < size:
+                row = i * size
+                j = y % size
+                while j < size:
+                    tree[row + j] += delta
+                    j |= j + 1
+                i |= i + 1
+
+        if not (block[2] or block[3]):
+            del self.blocks[key]
+
+    def rectSum(self, which, x0, x1, y0, y1):
+        '''
+        Return the sum of COUNTS or FOOD over x0..x1, y0..y1 (inclusive,
+        not wrapping.)
+        '''
+        size = self.BLOCK
+        blocks = self.blocks
+        bx0, bx1 = x0 // size, x1 // size
+        by0, by1 = y0 // size, y1 // size
+        if (bx1 - bx0 + 1) * (by1 - by0 + 1) > len(blocks):
+            keys = [
+                key for key in blocks
+                if bx0 <= key[0] <= bx1 and by0 <= key[1] <= by1
+                ]
+        else:
+            keys = [
+                (bx, by)
+                for bx in xrange(bx0, bx1 + 1)
+                for by in xrange(by0, by1 + 1)
+                ]
+
+        total = 0
+        last = size - 1
+        for key in keys:
+            block = blocks.get(key)
+            if block is None:
+                continue
+            bx, by = key
+            lx0 = max(x0 - bx * size, 0)
+            lx1 = min(x1 - bx * size, last)
+            ly0 = max(y0 - by * size, 0)
+            ly1 = min(y1 - by * size, last)
+            if lx0 == ly0 == 0 and lx1 == ly1 == last:
+                total += block[2 + which]
+            else:
+                tree = block[which]
+                total += (
+                    _prefix(tree, size, lx1, ly1)
+                    - _prefix(tree, size, lx0 - 1, ly1)
+                    - _prefix(tree, size, lx1, ly0 - 1)
+                    + _prefix(tree, size, lx0 - 1, ly0 - 1)
+                    )
+        return total
+
+
+def _prefix(tree, size, i, j):
+    # Sum of the Fenwick tree's cells 0..i, 0..j.
+    total = 0
+    while i >= 0:
+        row = i * size
+        jj = j
+        while jj >= 0:
+            total += tree[row + jj]
+            jj = (jj & (jj + 1)) - 1
+        i = (i & (i + 1)) - 1
+    return total
+
 
 class Location:
     '''
@@ -254,6 +822,9 @@ class Location:
         '''
         assert person not in self.occupants
         self.occupants.append(person)
+        aggregates = self.space.aggregates
+        if aggregates is not None:
+            aggregates.add(self.coords, 1, 0)
 
     def leave(self, person):
         '''
@@ -261,6 +832,9 @@ class Location:
         '''
         assert person in self.occupants
         self.occupants.remove(person)
+        aggregates = self.space.aggregates
+        if aggregates is not None:
+            aggregates.add(self.coords, -1, 0)
 
     def getNearby(self, distance, predicate=None):
         '''
@@ -286,6 +860,7 @@ class Location:
             self.food = Food(amount)
         else:
             self.food.add(amount)
+        self.space.noteFood(self.coords, amount)
         global _calories
         _calories += amount
 
@@ -310,25 +885,55 @@ class Location:
                     res = amount # We finished off the food exactly.
                 else:
                     res = -res # We only got this much food.
+            self.space.noteFood(self.coords, -res)
         return res
 
     def __str__(self):
         # Support for string representation.
-        n = len(self.occupants)
-        if n:
-            if n == 1:
-                occ = self.occupants[0]
-                if occ.infections:
-                    return '@'
-                else:
-                    return 'o'
-            elif n > 9:
-                return '+'
+        return _glyph(self.occupants, self.food)
+
+
+# Colour codes for cells, the same numbers as the curses colour pairs in
+# curses_sbonu.
+NOTHING, EMPTY, CLEAN, FOOD, INFECTED = range(5)
+
+
+def _colour(occupants, food):
+    '''
+    Return the colour code of a location with the given occupants and
+    food.
+    '''
+    n = len(occupants)
+    if n:
+        if n == 1 and occupants[0].infections:
+            return INFECTED
+        return CLEAN
+    elif food:
+        return FOOD
+    return EMPTY
+
+
+def _glyph(occupants, food):
+    '''
+    Return the one-character string representation of a location with
+    the given occupants and food.
+    '''
+    n = len(occupants)
+    if n:
+        if n == 1:
+            occ = occupants[0]
+            if occ.infections:
+                return '@'
             else:
-                return str(n)
-        elif self.food:
-            return 'f'
-        return '.'
+                return 'o'
+        elif n > 9:
+            return '+'
+        else:
+            return str(n)
+    elif food:
+        return 'f'
+    return '.'
+
 
 class Food:
     '''
@@ -367,3 +972,405 @@ class Food:
             res = amount
             self.amount -= amount
         return res
+
+
+class ChunkedSpace(Space):
+    '''
+    A Space that stores the world in fixed-size square chunks instead of
+    one dict entry per Location.  Chunks are allocated when a cell in
+    them is first touched and freed again when their last food and
+    occupant are gone, so very large, sparsely populated worlds (e.g.
+    100,000 x 100,000) only pay for the regions actually in use.
+
+    Each chunk keeps its food amounts and occupant counts in compact
+    arrays; the Location-like objects handed out by get(), getOrMake()
+    and within() are lightweight views onto those arrays.
+    '''
+
+    def __init__(
+        self,
+        dimension,
+        food_growth_rate=30,
+        pad=None,
+        chunk_size=32,
+        backend='python',
+        ):
+        Space.__init__(self, dimension, food_growth_rate, pad)
+        self.space = None # Not used, see self.chunks.
+        self.chunks = {}
+        self.chunk_size = chunk_size
+        self.span = (dimension + chunk_size - 1) // chunk_size
+        self.kernels = kernels.backend(backend)
+        self._scratch = array('i', [0]) * (chunk_size * chunk_size)
+
+    def _locate(self, x, y):
+        '''
+        Return the (chunk key, cell index) pair for x, y.
+        '''
+        cx, lx = divmod(x, self.chunk_size)
+        cy, ly = divmod(y, self.chunk_size)
+        return cx * self.span + cy, lx * self.chunk_size + ly
+
+    def _chunk(self, key):
+        '''
+        Return the Chunk for key, allocating it first if needed.
+        '''
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = Chunk(self.chunk_size)
+        return chunk
+
+    def _release(self, key, chunk):
+        '''
+        Free chunk if nothing lives in it anymore.
+        '''
+        if not chunk.live and self.chunks.get(key) is chunk:
+            del self.chunks[key]
+
+    def getOrMake(self, x, y):
+        '''
+        Return the Location at x, y.  (Storage is only allocated once
+        something is put there.)
+        '''
+        key, index = self._locate(x, y)
+        return ChunkLocation(self, (x, y), key, index)
+
+    def get(self, x, y):
+        '''
+        Return the Location at x, y or None if there's nothing there.
+        '''
+        if not (0 <= x < self.dim and 0 <= y < self.dim):
+            return None
+        key, index = self._locate(x, y)
+        chunk = self.chunks.get(key)
+        if chunk is None or not chunk.isLive(index):
+            return None
+        return ChunkLocation(self, (x, y), key, index)
+
+    def within(self, x, y, distance):
+        '''
+        Return list of Location objects within distance from x, y.
+        '''
+        return self._scan(x, y, distance, False)
+
+    def one_food(self):
+        '''
+        Randomly place a food somewhere.
+        '''
+        x = random.randint(0, self.dim - 1)
+        y = random.randint(0, self.dim - 1)
+
+        # Find all food stuffs within 4.
+        nearby = self._scan(x, y, 4, True)
+
+        if nearby:
+            location = random.choice(nearby)
+        else:
+            location = self.getOrMake(x, y)
+
+        location.addFood()
+
+    def _scan(self, x, y, distance, food_only):
+        # Return the live (or just the food) Locations within distance.
+        size = self.chunk_size
+        scan_box = self.kernels.scan_box
+        found = self._scratch
+        left = max(x - distance, 0)
+        right = min(x + distance, self.dim - 1)
+        top = max(y - distance, 0)
+        bottom = min(y + distance, self.dim - 1)
+
+        result = []
+        for cx in range(left // size, right // size + 1):
+            for cy in range(top // size, bottom // size + 1):
+                key = cx * self.span + cy
+                chunk = self.chunks.get(key)
+                if chunk is None:
+                    continue
+                x0 = cx * size
+                y0 = cy * size
+                n = scan_box(
+                    chunk.food,
+                    chunk.food if food_only else chunk.count,
+                    size,
+                    max(left - x0, 0),
+                    min(right - x0, size - 1),
+                    max(top - y0, 0),
+                    min(bottom - y0, size - 1),
+                    found,
+                    )
+                for index in found[:n]:
+                    lx, ly = divmod(index, size)
+                    result.append(
+                        ChunkLocation(self, (x0 + lx, y0 + ly), key, index))
+        return result
+
+    def countLocations(self):
+        '''
+        Return the number of cells with food or occupants.
+        '''
+        return sum(len(chunk.live) for chunk in self.chunks.itervalues())
+
+    def encodeFrame(self):
+        '''
+        As Space.encodeFrame(), filling each chunk's cells in straight
+        from its arrays.
+        '''
+        dim = self.dim
+        size = self.chunk_size
+        glyphs = bytearray(b' ') * (dim * dim)
+        colours = bytearray(dim * dim)
+
+        # The offset of each cell of a chunk from the chunk's corner.
+        offsets = [ly * dim + lx for lx in range(size) for ly in range(size)]
+
+        for key, chunk in self.chunks.iteritems():
+            cx, cy = divmod(key, self.span)
+            corner = cy * size * dim + cx * size
+            food = chunk.food
+            for index in chunk.live:
+                if food[index]:
+                    i = corner + offsets[index]
+                    glyphs[i] = 'f'
+                    colours[i] = FOOD
+            for index, occupants in chunk.occupants.iteritems():
+                i = corner + offsets[index]
+                glyphs[i] = _glyph(occupants, None)
+                colours[i] = _colour(occupants, None)
+
+        return glyphs, colours
+
+    def _foodCells(self):
+        size = self.chunk_size
+        for key, chunk in self.chunks.iteritems():
+            cx, cy = divmod(key, self.span)
+            food = chunk.food
+            for index in chunk.liveCells():
+                if food[index]:
+                    lx, ly = divmod(index, size)
+                    yield (cx * size + lx, cy * size + ly), food[index]
+
+    def _iterLocations(self):
+        # As Space does, only go through the cells that are live to
+        # begin with, so that people moving into new cells during a step
+        # don't get another turn.
+        cells = []
+        for key, chunk in list(self.chunks.items()):
+
+            # Free any empty chunks.
+            if not chunk.live:
+                del self.chunks[key]
+                continue
+
+            cells.append((key, chunk.liveCells()))
+
+        size = self.chunk_size
+        chunks = self.chunks
+        for key, indices in cells:
+            cx, cy = divmod(key, self.span)
+            x0 = cx * size
+            y0 = cy * size
+            for index in indices:
+                chunk = chunks.get(key)
+                if chunk is None:
+                    break
+                if chunk.isLive(index):
+                    lx, ly = divmod(index, size)
+                    yield ChunkLocation(self, (x0 + lx, y0 + ly), key, index)
+
+
+class Chunk(object):
+    '''
+    One chunk_size x chunk_size block of a ChunkedSpace.
+    '''
+
+    __slots__ = ('food', 'count', 'occupants', 'live')
+
+    def __init__(self, chunk_size):
+        cells = chunk_size * chunk_size
+        self.food = array('i', [0]) * cells
+        self.count = array('i', [0]) * cells
+        self.occupants = {} # Map cell index to list of people.
+        self.live = set() # Indices of cells with food or occupants.
+
+    def isLive(self, index):
+        return self.food[index] or self.count[index]
+
+    def liveCells(self):
+        '''
+        Return a list of the index of every cell with food or occupants,
+        in increasing order.
+        '''
+        return sorted(self.live)
+
+
+class ChunkLocation(object):
+    '''
+    A view onto one cell of a ChunkedSpace, supporting the same
+    interface as Location.
+    '''
+
+    __slots__ = ('space', 'coords', 'key', 'index')
+
+    def __init__(self, space, coords, key, index):
+        self.space = space
+        self.coords = coords
+        self.key = key
+        self.index = index
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ChunkLocation)
+            and self.space is other.space
+            and self.coords == other.coords
+            )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.coords)
+
+    @property
+    def food(self):
+        chunk = self.space.chunks.get(self.key)
+        if chunk is not None and chunk.food[self.index]:
+            return ChunkFood(self)
+        return None
+
+    @property
+    def occupants(self):
+        chunk = self.space.chunks.get(self.key)
+        if chunk is None:
+            return []
+        return chunk.occupants.get(self.index, [])
+
+    def empty(self):
+        '''
+        Return bool indicating if this Location is empty.
+        '''
+        chunk = self.space.chunks.get(self.key)
+        return chunk is None or not chunk.isLive(self.index)
+
+    def occupied(self):
+        '''
+        Return bool indicating if this Location has any people in it.
+        '''
+        chunk = self.space.chunks.get(self.key)
+        return chunk is not None and bool(chunk.count[self.index])
+
+    def enter(self, person):
+        '''
+        Move person into Location
+        '''
+        chunk = self.space._chunk(self.key)
+        index = self.index
+        chunk.live.add(index)
+        occupants = chunk.occupants.setdefault(index, [])
+        assert person not in occupants
+        occupants.append(person)
+        chunk.count[index] += 1
+        aggregates = self.space.aggregates
+        if aggregates is not None:
+            aggregates.add(self.coords, 1, 0)
+
+    def leave(self, person):
+        '''
+        Remove person from Location.
+        '''
+        chunk = self.space.chunks[self.key]
+        index = self.index
+        occupants = chunk.occupants[index]
+        assert person in occupants
+        occupants.remove(person)
+        chunk.count[index] -= 1
+        aggregates = self.space.aggregates
+        if aggregates is not None:
+            aggregates.add(self.coords, -1, 0)
+        if not occupants:
+            del chunk.occupants[index]
+            if not chunk.food[index]:
+                chunk.live.discard(index)
+                self.space._release(self.key, chunk)
+
+    def getNearby(self, distance, predicate=None):
+        '''
+        Return a list of all Location objects within distance.  If
+        predicate is given, it should be a filter callable that takes a
+        Location and returns True or False to indicate whether the
+        Location should be included in the list.
+        '''
+        x, y = self.coords
+        nearby = self.space.within(x, y, distance)
+
+        if predicate:
+            nearby = [loc for loc in nearby if predicate(loc)]
+
+        return nearby
+
+    def addFood(self, amount=1):
+        '''
+        Add amount food to Location.  Tracks total food added using
+        global _calories.
+        '''
+        chunk = self.space._chunk(self.key)
+        index = self.index
+        chunk.live.add(index)
+        chunk.food[index] += amount
+        self.space.noteFood(self.coords, amount)
+        global _calories
+        _calories += amount
+
+    def eat(self, amount=1):
+        '''
+        Attempt to return amount from Location's food.
+        '''
+        chunk = self.space.chunks.get(self.key)
+        if chunk is None:
+            return 0
+
+        index = self.index
+        available = chunk.food[index]
+        if not available:
+            return 0
+
+        if amount < available:
+            chunk.food[index] = available - amount
+            self.space.noteFood(self.coords, -amount)
+            return amount
+
+        # We exhausted the food..
+        chunk.food[index] = 0
+        self.space.noteFood(self.coords, -available)
+        if not chunk.count[index]:
+            chunk.live.discard(index)
+            self.space._release(self.key, chunk)
+        return available
+
+    def __str__(self):
+        # Support for string representation.
+        return _glyph(self.occupants, self.food)
+
+
+class ChunkFood(object):
+    '''
+    A view onto the food at one ChunkLocation.  Supports the amount
+    attribute and add() of Food; eating goes through the Location so
+    that exhausted cells can be freed.
+    '''
+
+    __slots__ = ('location',)
+
+    def __init__(self, location):
+        self.location = location
+
+    @property
+    def amount(self):
+        location = self.location
+        return location.space.chunks[location.key].food[location.index]
+
+    def add(self, amount):
+        '''Add amount of food to self.'''
+        location = self.location
+        location.space.chunks[location.key].food[location.index] += amount
+        location.space.noteFood(location.coords, amount)
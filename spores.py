@@ -1,7 +1,76 @@
 import random
+from array import array
+from itertools import count
 from weakref import ref
 
 
+# Source of the ids that identify people in the transmission log.
+_ids = count(1)
+
+# Optional TransmissionLog (see eventlog.py) recording infection attempts.
+_event_log = None
+
+
+def setEventLog(log):
+    '''
+    Start recording infection attempts in log (None to stop.)
+    '''
+    global _event_log
+    _event_log = log
+
+
+def getEventLog():
+    '''
+    Return the current transmission log, or None.
+    '''
+    return _event_log
+
+
+# Optional TitheLedger deferring Spore.act() food transfers.
+_ledger = None
+
+
+def setLedger(ledger):
+    '''
+    Start collecting tithes in ledger (None to go back to paying them
+    immediately.)
+    '''
+    global _ledger
+    _ledger = ledger
+
+
+def getLedger():
+    '''
+    Return the current tithe ledger, or None.
+    '''
+    return _ledger
+
+
+# Genus names are interned to small integer ids, see genusId().
+_genus_ids = {}
+_genus_names = []
+
+
+def genusId(genus):
+    '''
+    Return the small integer id of genus, assigning the next free one the
+    first time a genus is seen.
+    '''
+    try:
+        return _genus_ids[genus]
+    except KeyError:
+        gid = _genus_ids[genus] = len(_genus_names)
+        _genus_names.append(genus)
+        return gid
+
+
+def genusNames():
+    '''
+    Return a list of the genera seen so far, indexed by genus id.
+    '''
+    return list(_genus_names)
+
+
 def _appendWeakref(list_, obj):
     '''
     append() a weakref to object to list_ with a callback that remove()'s
@@ -14,6 +83,105 @@ def _appendWeakref(list_, obj):
     return list_
 
 
+class Immunities(object):
+    '''
+    A person's immunity (0.0 to 1.0) to each genus, stored in an array
+    indexed by genus id.  Also supports the dict-style access by genus
+    name of the {genus: immunity} map it replaces; genera with no
+    immunity at all count as missing.
+    '''
+
+    __slots__ = ('levels',)
+
+    def __init__(self):
+        self.levels = array('d')
+
+    def level(self, gid):
+        '''
+        Return the immunity to genus id gid.
+        '''
+        levels = self.levels
+        if gid < len(levels):
+            return levels[gid]
+        return 0.0
+
+    def setLevel(self, gid, value):
+        '''
+        Set the immunity to genus id gid.
+        '''
+        levels = self.levels
+        if gid >= len(levels):
+            levels.extend([0.0] * (gid + 1 - len(levels)))
+        levels[gid] = value
+
+    def raiseLevel(self, gid, amount):
+        '''
+        Increase the immunity to genus id gid by amount, up to 1.0.
+        '''
+        self.setLevel(gid, min((self.level(gid) + amount, 1.0)))
+
+    def update(self, other):
+        '''
+        Copy immunities from other (Immunities or a dict.)
+        '''
+        if isinstance(other, Immunities):
+            for gid, value in enumerate(other.levels):
+                if value:
+                    self.setLevel(gid, value)
+        else:
+            for genus, value in other.items():
+                self.setLevel(genusId(genus), value)
+
+    def items(self):
+        return [
+            (_genus_names[gid], value)
+            for gid, value in enumerate(self.levels)
+            if value
+            ]
+
+    def keys(self):
+        return [genus for genus, value in self.items()]
+
+    def get(self, genus, default=None):
+        gid = _genus_ids.get(genus)
+        if gid is None:
+            return default
+        return self.level(gid) or default
+
+    def __getitem__(self, genus):
+        value = self.get(genus)
+        if value is None:
+            raise KeyError(genus)
+        return value
+
+    def __setitem__(self, genus, value):
+        self.setLevel(genusId(genus), value)
+
+    def __contains__(self, genus):
+        return self.get(genus) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Immunities):
+            other = other.items()
+        elif isinstance(other, dict):
+            other = sorted(other.items(), key=lambda item: genusId(item[0]))
+        else:
+            return NotImplemented
+        return self.items() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Immunities(%r)' % (dict(self.items()),)
+
+
 class Spawner:
     '''
     Source of spores for a genus, tied to one author.
@@ -43,6 +211,7 @@ class Spore:
     def __init__(self, genus, chain=None):
         if chain is None: chain = []
         self.genus = genus
+        self.genus_id = genusId(genus)
         self.chain = self.prepChain(chain)
 
     def prepChain(self, chain):
@@ -65,7 +234,7 @@ class Spore:
         '''
         Return Boolean indictating success of an attepmt to infect person.
         '''
-        suscept = person.susceptibilityTo(self.genus)
+        suscept = person.susceptibilityTo(self.genus_id)
 
         if suscept:
             chance = suscept * self.virulence
@@ -95,14 +264,22 @@ class Spore:
         return self.__class__(self.genus, self.chain)
 
     def act(self, person):
+        '''
+        Maybe make person tithe to the author and vectors of this spore,
+        return the amount tithed.
+        '''
         if random.random() <= 0.05:
 
             if person.foods <= 100:
-                return
+                return 0
 
             author = self.chain[0]()
             if not author:
-                return
+                return 0
+
+            if _ledger is not None:
+                _ledger.tithe(person, self.chain)
+                return 20
 
             person.foods -= 20
             cut = 6
@@ -113,6 +290,88 @@ class Spore:
                     cut -= 1
 
             author.foods += 14 + cut
+            return 20
+
+        return 0
+
+
+class TitheLedger:
+    '''
+    Collects the tithes of Spore.act() during a step and settles them in
+    one pass with settle(), instead of dereferencing the author and
+    ancestors of the chain and moving food for every tithe.  Recording a
+    tithe only keeps the chain's weakrefs; each is dereferenced at most
+    once per settle().
+
+    Tithes are the same as paying immediately, except that the payer's
+    food isn't taken until settle() (so it doesn't affect whether they
+    tithe again in the same step), and ancestors or authors who die
+    before settle() don't get their share.  If the author has died the
+    whole tithe is forfeited, as if it had never been asked for.
+
+    After each settle(), flows holds that step's totals: tithes, paid,
+    to ancestors, to authors and forfeited food; totals accumulates
+    them over all steps.
+    '''
+
+    FLOWS = ('tithes', 'paid', 'ancestors', 'authors', 'forfeited')
+
+    def __init__(self):
+        # (payer, amount, author weakref, ancestor weakrefs) per tithe.
+        self.pending = []
+        self.flows = dict.fromkeys(self.FLOWS, 0)
+        self.totals = dict.fromkeys(self.FLOWS, 0)
+
+    def tithe(self, payer, chain, amount=20):
+        '''
+        Record that payer tithes to the author and ancestors in chain.
+        '''
+        self.pending.append((payer, amount, chain[0], chain[:-7:-1]))
+
+    def settle(self):
+        '''
+        Apply all recorded tithes and reset for the next step.
+        '''
+        # Weakrefs to the dead can't be hashed, so go by id().  (They're
+        # kept alive by self.pending meanwhile.)
+        resolved = {}
+        def deref(wref):
+            try:
+                return resolved[id(wref)]
+            except KeyError:
+                obj = resolved[id(wref)] = wref()
+                return obj
+
+        tithes = paid = to_ancestors = to_authors = forfeited = 0
+        earnings = {}
+        for payer, amount, author, ancestors in self.pending:
+            author = deref(author)
+            if author is None:
+                forfeited += amount
+                continue
+
+            payer.foods -= amount
+            paid += amount
+            tithes += 1
+            cut = 6
+            for ancestor in ancestors:
+                ancestor = deref(ancestor)
+                if ancestor is not None:
+                    earnings[ancestor] = earnings.get(ancestor, 0) + 1
+                    to_ancestors += 1
+                    cut -= 1
+            earnings[author] = earnings.get(author, 0) + 14 + cut
+            to_authors += 14 + cut
+
+        for person, amount in earnings.iteritems():
+            person.foods += amount
+
+        del self.pending[:]
+        flows = self.flows = dict(zip(
+            self.FLOWS, (tithes, paid, to_ancestors, to_authors, forfeited)))
+        for name, value in flows.items():
+            self.totals[name] += value
+        return flows
 
 
 class Infectable:
@@ -122,7 +381,7 @@ class Infectable:
     def __init__(self):
 
         # Map from genus to immunity (0.0 to 1.0).
-        self.immunities = {}
+        self.immunities = Immunities()
 
         # Spores that have infected this person and are now available to
         # be used to infect others.
@@ -134,6 +393,20 @@ class Infectable:
         # Set when the person enters a Space.
         self.space = None
 
+        # Identifies the person in the transmission log.
+        self.id = next(_ids)
+
+    def reset(self):
+        '''
+        Return self to the state of a newly made person, reusing its
+        containers.  (See sbonu.AgentPool.)
+        '''
+        del self.immunities.levels[:]
+        del self.infections[:]
+        self.foods = 100
+        self.space = None
+        self.id = next(_ids)
+
     def immuneResponse(self, spore):
         '''
         Resolve an attempt of spore to infect self.  Either an infection
@@ -146,39 +419,47 @@ class Infectable:
         infected = spore.infects(self)
 
         # Regardless, maybe we tithe..
-        spore.act(self)
+        tithe = spore.act(self)
 
         if infected:
             self.infection(spore)
         else:
             self.buildResistance(spore)
 
+        if _event_log is not None:
+            _event_log.record(spore, self, infected, tithe)
+
         return not infected
 
     def buildResistance(self, spore):
         '''
         Increase self's resistance to the genus of spore.
         '''
-        imm = self.immunities.get(spore.genus, 0.0)
-        self.immunities[spore.genus] = min((imm + 0.01, 1.0))
+        immunities = self.immunities
+        level = immunities.level(spore.genus_id)
+        immunities.raiseLevel(spore.genus_id, 0.01)
+        if level < 1.0 and self.space is not None and \
+           immunities.level(spore.genus_id) == 1.0:
+            self.space.noteResistance(self, spore)
 
     def infection(self, spore):
         '''
         Infect self with spore.
         '''
+        level = self.immunities.level(spore.genus_id)
         self.infections.append(spore)
-        self.immunities[spore.genus] = 1.0
+        self.immunities.setLevel(spore.genus_id, 1.0)
+        if self.space is not None:
+            self.space.noteInfection(self, spore, level)
 
     def susceptibilityTo(self, genus):
         '''
         Return a float between 0 and 1 indicating self's "susceptibility"
-        to infection by spores of genus genus.
+        to infection by spores of genus genus (a name or a genus id.)
         '''
-        try:
-            imm = self.immunities[genus]
-        except KeyError:
-            imm = 0.0
-        return 1 - imm
+        if not isinstance(genus, int):
+            genus = genusId(genus)
+        return 1 - self.immunities.level(genus)
 
     def afflict(self, other, spore=None):
         '''
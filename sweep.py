@@ -0,0 +1,202 @@
+'''
+
+sweep.py - Adaptive parameter sweeps with early stopping.
+
+Each replicate run is stopped as soon as its getStats() series has
+settled: everybody is infected or immune, the infection (or population)
+has died out, or, once some people are immune, the numbers infected and
+immune have stopped moving over a window of steps.  The steps saved go
+into extra replicates of the configurations whose outcomes vary most
+between replicates.
+
+'''
+import random
+
+import sbonu
+
+
+def settled(series, window=25, tolerance=0):
+    '''
+    Return why the run with stats series has settled ('saturated',
+    'extinct' or 'steady') or None if it hasn't.
+
+    A run is only steady once somebody has been immune all through the
+    last window steps and the numbers infected and immune have moved by
+    no more than tolerance people over them.  (Before anybody is immune
+    the epidemic may just be slow to get going.)
+    '''
+    pop, infected, immune, fud = series[-1]
+    if infected + immune >= 1.0:
+        return 'saturated'
+    if not pop or not infected:
+        return 'extinct'
+    if len(series) >= window:
+        recent = [_counts(stats) for stats in series[-window:]]
+        if not min(counts[1] for counts in recent):
+            return None
+        for field in (0, 1):
+            values = [counts[field] for counts in recent]
+            if max(values) - min(values) > tolerance:
+                return None
+        return 'steady'
+    return None
+
+
+def _counts(stats):
+    '''
+    Return the numbers of (infected, immune) people in getStats() stats.
+    '''
+    pop, infected, immune, fud = stats
+    return int(round(infected * pop)), int(round(immune * pop))
+
+
+def outcome(series):
+    '''
+    Return the outcome of a run: its final infected + immune fraction.
+    '''
+    pop, infected, immune, fud = series[-1]
+    return infected + immune
+
+
+def _variance(values):
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean = sum(values) / float(n)
+    return sum((v - mean) ** 2 for v in values) / (n - 1)
+
+
+class AdaptiveSweep:
+    '''
+    Run replicates of each setup_sim() parameter dict in configs, within
+    a total budget of simulation steps.
+    '''
+
+    def __init__(
+        self,
+        configs,
+        budget,
+        replicates=3,
+        max_steps=500,
+        window=25,
+        tolerance=0,
+        seed=0,
+        cache=None,
+        ):
+        self.configs = configs
+        self.budget = budget
+        self.replicates = replicates
+        self.max_steps = max_steps
+        self.window = window
+        self.tolerance = tolerance
+        self.seed = seed
+
+        # Optional RunCache of replicates from earlier sweeps.
+        self.cache = cache
+
+        # Steps spent so far.
+        self.spent = 0
+
+        # For each config, a list of (outcome, steps, reason) tuples.
+        # Reason is None for runs that went the full max_steps and
+        # 'budget' for runs cut short by the budget running out, whose
+        # outcomes aren't counted.
+        self.results = [[] for _ in configs]
+
+    def runReplicate(self, index):
+        '''
+        Run one more replicate of configs[index], return its result.
+        Replicates found in the cache cost the same budget they would
+        to run, so a sweep picks the same runs with or without it.
+        '''
+        seed = hash((self.seed, index, len(self.results[index])))
+        steps = min(self.max_steps, self.budget - self.spent)
+
+        series = key = None
+        if self.cache is not None:
+            key = self.cache.runKey(
+                seed,
+                self.max_steps,
+                stop=('settled', self.window, self.tolerance),
+                **self.configs[index]
+                )
+            series = self.cache.get(key)
+
+        if series is None:
+            series = self._simulate(seed, self.configs[index], steps)
+            finished = len(series) == self.max_steps or (
+                series and settled(series, self.window, self.tolerance))
+            if key is not None and finished:
+                self.cache.put(key, series)
+
+        series = series[:steps]
+        reason = settled(series, self.window, self.tolerance) if series else None
+        if not reason and len(series) < self.max_steps:
+            reason = 'budget'
+
+        self.spent += len(series)
+        result = outcome(series) if series else 0.0, len(series), reason
+        self.results[index].append(result)
+        return result
+
+    def _simulate(self, seed, config, steps):
+        # Return the stats series of up to steps steps of a run, stopping
+        # once it has settled.
+        random.seed(seed)
+        Alice, S, sim = sbonu.setup_sim(**config)
+        series = []
+        for _ in xrange(steps):
+            sim.step()
+            series.append(sim.space.getStats())
+            if settled(series, self.window, self.tolerance):
+                break
+        return series
+
+    def outcomes(self, index):
+        '''
+        Return the outcomes of the runs of configs[index] that weren't
+        cut short by the budget.
+        '''
+        return [
+            result[0]
+            for result in self.results[index]
+            if result[2] != 'budget'
+            ]
+
+    def pick(self):
+        '''
+        Return the index of the config most in need of another replicate:
+        the one with the highest outcome variance (fewest replicates
+        breaks ties.)
+        '''
+        def need(index):
+            outcomes = self.outcomes(index)
+            return _variance(outcomes), -len(outcomes)
+        return max(range(len(self.configs)), key=need)
+
+    def run(self):
+        '''
+        Run the sweep until the budget is spent, return self.results.
+        '''
+        for _ in range(self.replicates):
+            for index in range(len(self.configs)):
+                if self.spent >= self.budget:
+                    return self.results
+                self.runReplicate(index)
+
+        while self.spent < self.budget:
+            self.runReplicate(self.pick())
+
+        return self.results
+
+    def summary(self):
+        '''
+        Return a list of (replicates, mean outcome, variance) per config.
+        '''
+        summary = []
+        for index in range(len(self.configs)):
+            outcomes = self.outcomes(index)
+            n = len(outcomes)
+            mean = sum(outcomes) / float(n) if n else 0.0
+            summary.append((n, mean, _variance(outcomes)))
+        return summary
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+import os
+import pipes
+import shutil
+import sys
+import tempfile
+import unittest
+import cache
+import spores
+
+
+class TestRunCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = cache.RunCache(self.directory)
+
+    def test_run(self):
+        params = dict(dimension=20, number_of_npcs=10, virulence=0.1)
+        series = self.cache.run(1, 20, **params)
+        self.assert_(self.cache.misses == 1)
+        self.assert_(self.cache.run(1, 20, **params) == series)
+        self.assert_(self.cache.hits == 1)
+        self.cache.run(2, 20, **params)
+        self.assert_(self.cache.misses == 2)
+
+    def test_runKey(self):
+        class Other(spores.Spore):
+            virulence = 0.5
+        key = self.cache.runKey(1, 10, dimension=20)
+        self.assert_(key == self.cache.runKey(1, 10, dimension=20))
+        self.assert_(key != self.cache.runKey(1, 10, dimension=21))
+        self.assert_(key != self.cache.runKey(1, 10, dimension=20, spore_class=Other))
+
+        # Defaults spelled out or not.
+        key = self.cache.runKey(1, 10)
+        self.assert_(key == self.cache.runKey(1, 10, dimension=50))
+        self.assert_(key == self.cache.runKey(1, 10, virulence=0.05))
+        self.assert_(key != self.cache.runKey(1, 10, virulence=0.5))
+
+        # virulence overrides the class's own.
+        key = self.cache.runKey(1, 10, spore_class=Other)
+        self.assert_(key == self.cache.runKey(1, 10, spore_class=Other, virulence=0.5))
+        self.assert_(key != self.cache.runKey(1, 10, spore_class=Other, virulence=0.05))
+
+    def test_stableKey(self):
+        from space import Space, ChunkedSpace
+        from sbonu import ActivityScheduler
+        key = self.cache.runKey(1, 10, space_class=ChunkedSpace)
+        self.assert_(key != self.cache.runKey(1, 10, space_class=Space))
+        self.assert_(key == self.cache.runKey(1, 10, space_class=ChunkedSpace))
+
+        # The same key in another process.
+        script = (
+            'import cache, space; '
+            'print cache.RunCache(%r).runKey(1, 10, space_class=space.ChunkedSpace)'
+            % self.directory
+            )
+        pipe = os.popen('%s -c %s' % (sys.executable, pipes.quote(script)))
+        self.assert_(pipe.read().strip() == key)
+        self.failIf(pipe.close())
+
+        self.assertRaises(
+            TypeError, self.cache.runKey, 1, 10, scheduler=ActivityScheduler())
+        self.assertRaises(
+            TypeError, self.cache.runKey, 1, 10, space_class=lambda d, f: Space(d, f))
+
+    def test_evict(self):
+        self.cache.max_bytes = 0
+        self.cache.put('a', [1, 2, 3])
+        self.failIf(os.listdir(self.directory))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+import os
+import sys
+import tempfile
+import unittest
+import cPickle as pickle
+from StringIO import StringIO
+import cli
+
+
+class TestCLI(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def test_runAndReplay(self):
+        out = StringIO()
+        cli.main([
+            'run', '--steps', '5', '--seed', '1', '--dimension', '20',
+            '--npcs', '5', '--save', self.path,
+            '--distributions', self.path + '.d',
+            ], out)
+        lines = out.getvalue().splitlines()
+        self.assert_(1 <= len(lines) <= 5)
+        with open(self.path + '.d', 'rb') as f:
+            self.assert_(len(pickle.load(f)) == len(lines))
+        os.remove(self.path + '.d')
+
+        out = StringIO()
+        cli.main(['replay', self.path], out)
+        self.assert_(out.getvalue().splitlines() == lines)
+
+        for name in ('curses', 'Tkinter', 'pygame'):
+            self.failIf(name in sys.modules)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
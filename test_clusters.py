@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+import unittest
+import clusters
+import space
+
+
+class Person:
+    def __init__(self, infected=True):
+        self.infections = [None] if infected else []
+
+
+class TestClusterTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.space = space.Space(20, 1)
+        self.tracker = clusters.ClusterTracker(self.space)
+
+    def test_join(self):
+        a, b, c = Person(), Person(), Person()
+        self.space.enter(1, 1, a)
+        self.space.enter(5, 5, b)
+        self.assert_(self.tracker.stats() == (2, 1, {1: 2}))
+        self.space.enter(3, 3, Person(infected=False))
+        self.assert_(self.tracker.stats()[0] == 2)
+        self.space.enter(2, 2, c)
+        self.assert_(self.tracker.stats() == (2, 2, {1: 1, 2: 1}))
+        self.space.move(-2, -2, b)
+        self.assert_(self.tracker.stats() == (1, 3, {3: 1}))
+
+    def test_infection(self):
+        a, b = Person(), Person(infected=False)
+        self.space.enter(1, 1, a)
+        self.space.enter(1, 2, b)
+        b.infections.append(None)
+        self.space.noteInfection(b)
+        self.assert_(self.tracker.stats() == (1, 2, {2: 1}))
+
+    def test_splitOnRebuild(self):
+        a, b, c = Person(), Person(), Person()
+        self.space.enter(1, 1, a)
+        self.space.enter(2, 2, b)
+        self.space.enter(3, 3, c)
+        self.assert_(self.tracker.stats() == (1, 3, {3: 1}))
+        self.space.leave(b)
+        self.assert_(self.tracker.stats() == (1, 2, {2: 1}))
+        self.tracker.rebuild()
+        self.assert_(self.tracker.stats() == (2, 1, {1: 2}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+import os
+import tempfile
+import unittest
+import eventlog
+import spores
+
+
+class AlwaysSpore(spores.Spore):
+    virulence = 1.0
+
+
+class TestTransmissionLog(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.log = eventlog.TransmissionLog(self.path, block_size=2)
+        spores.setEventLog(self.log)
+
+    def test_record(self):
+        source = spores.Infectable()
+        spores.Spawner('log-genus', source, AlwaysSpore)
+        targets = [spores.Infectable() for _ in range(3)]
+
+        self.log.step = 7
+        for target in targets:
+            self.assert_(source.afflict(target))
+        self.failIf(source.afflict(targets[0]))
+        self.log.close()
+
+        gid = spores.genusId('log-genus')
+        records = list(eventlog.iterRecords(self.path))
+        self.assert_(len(records) == self.log.count == 4)
+        self.assert_(records[:3] == [
+            (7, source.id, target.id, gid, 1, 0) for target in targets
+            ])
+        self.assert_(records[3][2:5] == (targets[0].id, gid, 0))
+
+    def tearDown(self):
+        spores.setEventLog(None)
+        os.remove(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
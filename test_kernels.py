@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+import random
+import unittest
+from array import array
+import kernels
+import sbonu
+import space
+
+
+class TestKernels(unittest.TestCase):
+
+    def test_scan_box(self):
+        size = 8
+        a = array('i', [0]) * (size * size)
+        b = array('i', [0]) * (size * size)
+        a[3 * size + 4] = 2
+        b[5 * size + 1] = 1
+        b[7 * size + 7] = 1
+        out = array('i', [0]) * (size * size)
+        for name in ('python', 'numba'):
+            scan_box = kernels.backend(name).scan_box
+            n = scan_box(a, b, size, 2, 6, 0, 5, out)
+            self.assert_(list(out[:n]) == [3 * size + 4, 5 * size + 1])
+            n = scan_box(a, a, size, 0, 7, 0, 7, out)
+            self.assert_(list(out[:n]) == [3 * size + 4])
+
+    @unittest.skipIf(kernels.HAVE_NUMBA, 'numba is installed')
+    def test_fallback(self):
+        python = kernels.backend('python')
+        self.assert_(kernels.backend('numba') is python)
+        self.assert_(kernels.backend() is python)
+        self.assert_(python.scan_box is kernels.scan_box)
+        self.assertRaises(ValueError, kernels.backend, 'fortran')
+
+    @unittest.skipUnless(kernels.HAVE_NUMBA, 'numba is not installed')
+    def test_backendsAgree(self):
+        results = []
+        for name in ('python', 'numba'):
+            space_class = lambda *args: space.ChunkedSpace(
+                *args, chunk_size=16, backend=name)
+            random.seed(1234)
+            sim = sbonu.SbonuSimulation(
+                40, 10, 30,
+                space_class=space_class,
+                scheduler=sbonu.ActivityScheduler(),
+                )
+            self.assert_(sim.space.kernels.name == name)
+            for _ in range(30):
+                sim.step()
+            results.append((str(sim.space), sim.space.getStats()))
+        self.assert_(results[0] == results[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
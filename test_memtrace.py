@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+import unittest
+from StringIO import StringIO
+import memtrace
+import sbonu
+
+
+class TestMemoryTracer(unittest.TestCase):
+
+    def test_run(self):
+        log = StringIO()
+        sim = sbonu.SbonuSimulation(20, 5, 7, 0)
+        tracer = memtrace.MemoryTracer(log, interval=2)
+        tracer.run(sim, 5)
+        lines = log.getvalue().splitlines()
+        self.assert_(len([line for line in lines if line.startswith('step')]) == 2)
+        npcs = [line.split() for line in lines if line.split()[0] == 'NPC']
+        self.assert_(int(npcs[0][1]) >= 7)
+        self.assert_(len(npcs) == 2)
+
+    def test_countObjects(self):
+        npc = sbonu.NPC()
+        counts = memtrace.countObjects()
+        self.assert_(counts['NPC'] >= 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+import unittest
+import urllib2
+import metrics
+import sbonu
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.SimMetrics()
+        self.server = metrics.MetricsServer(self.metrics, 0).start()
+
+    def test_scrape(self):
+        sim = sbonu.SbonuSimulation(25, 10, 0, 0)
+        for _ in range(3):
+            self.metrics.step(sim)
+        self.metrics.observe(sim)
+
+        url = 'http://127.0.0.1:%i/metrics' % self.server.port
+        text = urllib2.urlopen(url).read()
+        lines = dict(
+            line.rsplit(' ', 1)
+            for line in text.splitlines()
+            if not line.startswith('#')
+            )
+        self.assert_(lines['sbonu_steps_total'] == '3')
+        self.assert_('sbonu_step_latency_seconds{quantile="0.5"}' in lines)
+        self.assert_(float(lines['sbonu_food']) == 30)
+        self.assert_(int(lines['process_resident_memory_bytes']) > 0)
+
+    def tearDown(self):
+        self.server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+import render
+import sbonu
+import space
+
+
+class Foo:
+    infections = ()
+
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+        self.space = space.Space(4, 1)
+        self.space.enter(1, 0, Foo())
+        self.space.getOrMake(2, 3).addFood()
+
+    def test_captureFrame(self):
+        dim, codes = render.captureFrame(self.space)
+        self.assert_(dim == 4)
+        self.assert_(codes[1] == render.CLEAN)
+        self.assert_(codes[3 * 4 + 2] == render.FOOD)
+        self.assert_(sum(codes) == render.CLEAN + render.FOOD)
+
+    def test_toRGB(self):
+        width, height, pixels = render.toRGB(render.captureFrame(self.space), 2)
+        self.assert_((width, height, len(pixels)) == (8, 8, 8 * 8 * 3))
+        red = bytearray(render.PALETTE[render.CLEAN])
+        for x, y in ((2, 0), (3, 0), (2, 1), (3, 1)):
+            offset = (y * width + x) * 3
+            self.assert_(pixels[offset:offset + 3] == red)
+        self.assert_(pixels[0:3] == bytearray(3))
+
+    def test_encodePNG(self):
+        width, height, pixels = render.toRGB(render.captureFrame(self.space))
+        png = render.encodePNG(width, height, pixels)
+        self.assert_(png.startswith(b'\x89PNG'))
+        self.assert_(struct.unpack('>II', png[16:24]) == (4, 4))
+        length, = struct.unpack('>I', png[33:37])
+        raw = zlib.decompress(png[41:41 + length])
+        self.assert_(len(raw) == 4 * (1 + 4 * 3))
+
+    def test_renderFrames(self):
+        directory = tempfile.mkdtemp()
+        try:
+            sim = sbonu.SbonuSimulation(10, 3, 5, 0)
+            frames = render.recordFrames(sim, 5)
+            paths = render.renderFrames(frames, directory, processes=2, batch=2)
+            self.assert_(len(paths) == 5)
+            self.assert_(sorted(os.listdir(directory)) == [
+                'frame%05i.png' % n for n in range(5)])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
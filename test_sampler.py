@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+import os
+import tempfile
+import unittest
+import sampler
+import sbonu
+
+
+class TestSampler(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def profile(self, mode):
+        Alice, S, sim = sbonu.setup_sim(dimension=30, number_of_npcs=40)
+        with sampler.Sampler(self.path, interval=0.001, mode=mode) as s:
+            for _ in range(30):
+                sim.step()
+        self.assert_(s.samples)
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        self.assert_(sum(int(line.rsplit(' ', 1)[1]) for line in lines) == s.samples)
+        return '\n'.join(lines)
+
+    def test_thread(self):
+        folded = self.profile('thread')
+        self.assert_('SbonuSimulation.step' in folded)
+        self.assert_('NPC.program' in folded)
+
+    def test_signal(self):
+        self.assert_('SbonuSimulation' in self.profile('signal'))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 #!/usr/bin/env python
+import os
+import random
 import unittest
 import sbonu
+import space
+import spores
 
 
 class TestSim(unittest.TestCase):
@@ -14,10 +18,161 @@ class TestSim(unittest.TestCase):
 
         self.assert_(fud == 10)
 
+    def test_step_until(self):
+        sim = sbonu.SbonuSimulation(25, 10, 20, 0)
+        self.failIf(sim.step_until(0, batch=5))
+        self.assert_(sim.steps == 0)
+        while not sim.step_until(0, batch=5):
+            pass
+        self.assert_(sim.steps == 1)
+        self.failIf(sim.step_until(0, batch=5))
+        sim.step()
+        self.assert_(sim.steps == 2)
+        self.assert_(sim.step_until(None))
+        self.assert_(sim.steps == 3)
+
+        # A step that raises is dropped, not left half done.
+        npc = sim.space.yieldPeople().next()
+        npc.program = lambda: 1 / 0
+        self.assertRaises(ZeroDivisionError, sim.step)
+        self.assert_(sim.steps == 3)
+        del npc.program
+        sim.step()
+        self.assert_(sim.steps == 4)
+
+    def test_run(self):
+        series = self.sim.run(3)
+        self.assert_(len(series) == 3)
+        self.assert_([fud for pop, infected, immune, fud in series] == [10, 20, 30])
+
+    def test_advance(self):
+        population, infected, immune, food = self.sim.advance(5, sbonu.extinct)
+        self.assert_(list(population) == [0])
+        self.assert_(list(food) == [10])
+
+        stop = sbonu.populationBounds(1, 100)
+        self.assert_(stop(self.sim.space))
+        self.sim.space.enter(1, 1, sbonu.NPC())
+        self.failIf(stop(self.sim.space))
+        self.failIf(sbonu.saturated(self.sim.space))
+
+    def test_setupVirulence(self):
+        class Other(spores.Spore):
+            virulence = 0.5
+        Alice, S, sim = sbonu.setup_sim(10, 1, 0)
+        self.assert_(S.spore_class.virulence == 0.05)
+        Alice, S, sim = sbonu.setup_sim(10, 1, 0, spore_class=Other)
+        self.assert_(S.spore_class.virulence == 0.5)
+        Alice, S, sim = sbonu.setup_sim(10, 1, 0, spore_class=Other, virulence=0.2)
+        self.assert_(S.spore_class.virulence == 0.2)
+        self.assert_(Other.virulence == 0.5)
+
+    def test_counters(self):
+        random.seed(3)
+        for space_class in (space.Space, space.ChunkedSpace):
+            Alice, S, sim = sbonu.setup_sim(
+                30, 10, 40, virulence=0.5, space_class=space_class)
+            Alice.immuneResponse(S.spawn())
+            for _ in range(30):
+                population, infected, immune, food = sim.advance(1, None)
+                N, fi, fm, fud = sim.space.getStats()
+                self.assert_((population[0], food[0]) == (N, fud))
+                self.assert_(infected[0] == round(fi * N))
+                self.assert_(immune[0] == round(fm * N))
+            self.assert_(sim.space.infected > 1)
+
+    def test_fork(self):
+        def mutate(sim, i):
+            sim.space.food_growth_rate = i
+        series = self.sim.fork(3, mutate, steps=2)
+        self.assert_([s[-1][3] for s in series] == [0, 2, 4])
+        self.assert_(self.sim.space.food_growth_rate == 10)
+
+        def fail(sim, i):
+            if not i:
+                raise ValueError
+        self.assertRaises(sbonu.ForkError, self.sim.fork, 3, fail, steps=2)
+        # Every branch has been reaped.
+        self.assertRaises(OSError, os.waitpid, -1, os.WNOHANG)
+
     def tearDown(self):
         self.sim = None
 
 
+class TestBulk(unittest.TestCase):
+
+    def test_fromArrays(self):
+        sim = sbonu.SbonuSimulation.fromArrays(
+            10, 5, [1, 1, 2], [3, 3, 4], foods=[7, 8, 9],
+            food_xs=[5, 6], food_ys=[5, 6], food_amounts=[2, 0])
+        location = sim.space.get(1, 3)
+        self.assert_([npc.foods for npc in location.occupants] == [7, 8])
+        self.assert_(sim.space.get(5, 5).food.amount == 2)
+        self.assert_(sim.space.get(6, 6) is None)
+        pop, infected, immune, fud = sim.space.getStats()
+        self.assert_((pop, fud) == (3, 2))
+
+    def test_bulk(self):
+        sim = sbonu.SbonuSimulation.bulk(
+            1000, 10, 500, 3, space_class=space.ChunkedSpace)
+        pop, infected, immune, fud = sim.space.getStats()
+        self.assert_((pop, fud) == (500, 30))
+        sim.step()
+
+
+class TestActivityScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = sbonu.ActivityScheduler()
+        self.sim = sbonu.SbonuSimulation(25, 10, 0, 0, scheduler=self.scheduler)
+        self.npc = sbonu.NPC()
+        self.sim.space.enter(5, 5, self.npc)
+
+    def test_classify(self):
+        space = self.sim.space
+        self.assert_(self.scheduler.classify(space, self.npc) == 'idle')
+        space.getOrMake(6, 4).addFood()
+        self.assert_(self.scheduler.classify(space, self.npc) == 'near food')
+        self.npc.infections.append(None)
+        self.assert_(self.scheduler.classify(space, self.npc) == 'infected')
+
+    def test_idleStep(self):
+        n = self.npc.foods
+        self.sim.step()
+        self.assert_(self.scheduler.counts['idle'] == 1)
+        self.assert_(self.npc.foods == n - 1)
+        self.assert_(self.sim.space.occupants[self.npc].coords != (5, 5))
+
+    def test_starve(self):
+        self.npc.foods = 0
+        self.sim.step()
+        self.assert_(self.npc.space is None)
+
+    def test_sameDynamics(self):
+        # Seeded runs with and without the scheduler must stay identical.
+        for space_class in (space.Space, space.ChunkedSpace):
+            results = []
+            for scheduler in (None, sbonu.ActivityScheduler()):
+                random.seed(42)
+                Alice, S, sim = sbonu.setup_sim(
+                    30, 20, 60,
+                    virulence=0.3,
+                    space_class=space_class,
+                    scheduler=scheduler,
+                    )
+                Alice.immuneResponse(S.spawn())
+                frames = []
+                for _ in range(60):
+                    sim.step()
+                    frames.append((str(sim.space), sim.space.getStats()))
+                results.append(frames)
+            self.assert_(results[0] == results[1])
+            self.assert_(results[0][-1][1][1] > 0)
+
+    def tearDown(self):
+        self.sim = self.scheduler = self.npc = None
+
+
 class TestNPC(unittest.TestCase):
     
     def setUp(self):
@@ -97,6 +252,56 @@ class TestNPC(unittest.TestCase):
         self.npc = None
 
 
+class TestAgentPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = sbonu.NPC.pool = sbonu.AgentPool(size=2)
+
+    def test_recycle(self):
+        npc = sbonu.NPC()
+        npc.foods = 3
+        npc.turns_o_plenty = 4
+        npc.immunities['cats'] = 0.5
+        n = npc.id
+        self.assert_(self.pool.release(npc))
+        self.assert_(self.pool.acquire() is npc)
+        self.assert_(npc.foods == 100)
+        self.failIf(npc.immunities)
+        self.failIf(hasattr(npc, 'turns_o_plenty'))
+        self.assert_(npc.id != n)
+
+        parent = sbonu.NPC()
+        parent.immunities['cats'] = 0.5
+        self.pool.release(npc)
+        clone = parent.clone()
+        self.assert_(clone is npc)
+        self.assert_(clone.immunities == parent.immunities)
+
+    def test_refuse(self):
+        npc = sbonu.NPC()
+        spore = spores.Spore('cats')
+        spore.register(npc)
+        self.failIf(self.pool.release(npc))
+
+        class Other(sbonu.NPC): pass
+        self.failIf(self.pool.release(Other()))
+
+        for _ in range(2):
+            self.assert_(self.pool.release(sbonu.NPC()))
+        self.failIf(self.pool.release(sbonu.NPC()))
+
+    def test_starve(self):
+        sim = sbonu.SbonuSimulation(25, 10, 0, 0)
+        npc = sbonu.NPC()
+        npc.foods = 0
+        sim.space.enter(5, 5, npc)
+        sim.step()
+        self.assert_(self.pool.free == [npc])
+
+    def tearDown(self):
+        sbonu.NPC.pool = self.pool = None
+
+
 class DummySpace:
 
     def __init__(self, *values):
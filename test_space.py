@@ -1,6 +1,8 @@
 #!/usr/bin/env python
+import random
 import unittest
 import space
+import spores
 
 
 class Foo: pass
@@ -34,6 +36,295 @@ class TestSpace(unittest.TestCase):
         self.failIf(list(self.space.yieldPeople()))
         self.assert_(foo.space is None)
         
+    def test_moveWraps(self):
+        foo = Foo()
+        self.space.enter(9, 0, foo)
+        self.assert_(self.space.move(1, -1, foo) == 1)
+        self.assert_(self.space.occupants[foo].coords == (0, 9))
+        self.space.move(-21, 20, foo)
+        self.assert_(self.space.occupants[foo].coords == (9, 9))
+
+    def test_encodeFrame(self):
+        foo = Foo()
+        foo.infections = [None]
+        self.space.enter(1, 2, foo)
+        self.space.getOrMake(3, 0).addFood()
+        self.space.getOrMake(4, 4)
+        glyphs, colours = self.space.encodeFrame()
+        self.assert_(len(glyphs) == len(colours) == 100)
+        self.assert_(chr(glyphs[2 * 10 + 1]) == '@')
+        self.assert_(colours[2 * 10 + 1] == space.INFECTED)
+        self.assert_(chr(glyphs[3]) == 'f' and colours[3] == space.FOOD)
+        self.assert_(chr(glyphs[44]) == '.' and colours[44] == space.EMPTY)
+
+        rows = str(self.space).split('\n')
+        self.assert_(len(rows) == 10)
+        for x in range(10):
+            for y in range(10):
+                L = self.space.get(x, y)
+                self.assert_(rows[x][y] == (str(L) if L else ' '))
+
+    def test_encodeFrameChunked(self):
+        chunked = space.ChunkedSpace(10, 1, chunk_size=4)
+        random.seed(3)
+        for _ in range(30):
+            x, y = random.randrange(10), random.randrange(10)
+            foo = Foo()
+            foo.infections = random.choice(([], [None]))
+            self.space.enter(x, y, foo)
+            chunked.enter(x, y, foo)
+            x, y = random.randrange(10), random.randrange(10)
+            self.space.getOrMake(x, y).addFood()
+            chunked.getOrMake(x, y).addFood()
+        self.assert_(chunked.encodeFrame() == self.space.encodeFrame())
+
+    def test_densityGrid(self):
+        self.space.enter(1, 1, Foo())
+        self.space.enter(9, 9, Foo())
+        self.space.getOrMake(0, 1).addFood(3)
+        self.space.getOrMake(9, 8).addFood()
+        for person in self.space.yieldPeople():
+            person.infections = []
+        blocks, population, infected, food = self.space.densityGrid(2)
+        self.assert_(blocks == 3)
+        self.assert_(list(population) == [1, 0, 0, 0, 0, 0, 0, 0, 1])
+        self.assert_(list(food) == [3, 0, 0, 0, 0, 0, 0, 0, 1])
+        self.failIf(sum(infected))
+
+        chunked = space.ChunkedSpace(10, 1, chunk_size=4)
+        chunked.bulkEnter([Foo(), Foo()], [1, 9], [1, 9])
+        chunked.bulkFood([0, 9], [1, 8], [3, 1])
+        for person in chunked.yieldPeople():
+            person.infections = [None]
+        for level in (0, 1, 2, 3):
+            grid = chunked.densityGrid(level)
+            self.assert_(grid[:2] == self.space.densityGrid(level)[:2])
+            self.assert_(grid[2] == grid[1])
+            self.assert_(grid[3] == self.space.densityGrid(level)[3])
+
+    def test_densityGridLevels(self):
+        def grid(space_, level):
+            # The same grid, cell by cell.
+            blocks = (space_.dim + (1 << level) - 1) >> level
+            counts = [[0] * (blocks * blocks) for _ in range(3)]
+            for x in range(space_.dim):
+                for y in range(space_.dim):
+                    L = space_.get(x, y)
+                    if L is None:
+                        continue
+                    i = (x >> level) * blocks + (y >> level)
+                    counts[0][i] += len(L.occupants)
+                    counts[1][i] += sum(1 for foo in L.occupants if foo.infections)
+                    counts[2][i] += L.food.amount if L.food else 0
+            return [blocks] + counts
+
+        random.seed(7)
+        for space_ in (space.Space(200, 1), space.ChunkedSpace(200, 1)):
+            people = [Foo() for _ in range(50)]
+            for foo in people:
+                foo.infections = random.choice(([], [None]))
+                space_.enter(random.randrange(200), random.randrange(200), foo)
+            for _ in range(300):
+                space_.generate()
+            for step in range(2):
+                for level in (3, 5, 6, 8):
+                    self.assert_(
+                        map(list, space_.densityGrid(level)[1:])
+                        == grid(space_, level)[1:])
+                # Now with the AggregateIndex kept up to date.
+                for foo in people:
+                    space_.move(random.randrange(-3, 4), 30, foo)
+                    space_.forage(foo)
+                space_.generate()
+
+    def test_aggregates(self):
+        for space_ in (self.space, space.ChunkedSpace(10, 1, chunk_size=4)):
+            people = [Foo() for _ in range(5)]
+            for foo, (x, y) in zip(people, [(0, 0), (0, 0), (9, 9), (5, 5), (1, 8)]):
+                space_.enter(x, y, foo)
+            space_.bulkFood([0, 9, 5], [1, 0, 5], [2, 3, 4])
+
+            self.assert_(space_.countWithin(0, 0, 1) == 3)
+            self.assert_(space_.countWithin(0, 9, 1) == 4)
+            self.assert_(space_.countWithin(5, 5, 0) == 1)
+            self.assert_(space_.countWithin(3, 3, 9) == 5)
+            self.assert_(space_.foodWithin(0, 0, 1) == 5)
+            self.assert_(space_.foodWithin(6, 6, 1) == 4)
+            self.assert_(space_.foodGradient(5, 3, 2) == (0, 1))
+            self.assert_(space_.foodGradient(0, 0, 1) == (-1, 1))
+
+            seen = set(space_.sampleWithin(0, 0, 1) for _ in range(200))
+            self.assert_(seen == set(people[:3]))
+            for _ in range(50):
+                self.assert_(space_.sampleWithin(0, 0, 1, people[2]) in people[:2])
+                self.assert_(space_.sampleWithin(9, 9, 0, people[2]) is None)
+            self.assert_(space_.sampleWithin(3, 3, 1) is None)
+
+            # Queries follow the world as it changes.
+            space_.leave(people[3])
+            self.assert_(space_.countWithin(5, 5, 0) == 0)
+            space_.move(5, 5, people[4])
+            self.assert_(space_.countWithin(6, 3, 0) == 1)
+            self.assert_(space_.sampleWithin(6, 3, 0) is people[4])
+            space_.forage(people[0])
+            self.assert_(space_.foodWithin(0, 1, 0) == 2)
+            space_.get(0, 1).eat(2)
+            self.assert_(space_.foodWithin(0, 0, 1) == 3)
+
+    def test_aggregatesHugeWorld(self):
+        huge = space.ChunkedSpace(100000, 1)
+        foo = Foo()
+        huge.enter(99999, 99999, foo)
+        huge.getOrMake(0, 0).addFood(3)
+        self.assert_(huge.countWithin(0, 0, 1) == 1)
+        self.assert_(huge.foodWithin(99999, 0, 1) == 3)
+        self.assert_(huge.sampleWithin(1, 1, 2) is foo)
+        self.assert_(len(huge.aggregates.blocks) == 2)
+        huge.leave(foo)
+        self.assert_(len(huge.aggregates.blocks) == 1)
+
+    def test_getGenusStats(self):
+        class Spore:
+            def __init__(self, genus): self.genus_id = spores.genusId(genus)
+        # (infected by, fully immune to, half immune to)
+        people = (
+            (['dogs'], ['mice'], []),
+            ([], ['dogs', 'mice'], []),
+            (['dogs', 'mice'], ['dogs'], []),
+            ([], [], ['mice']),
+            )
+        for infections, immune, half in people:
+            foo = spores.Infectable()
+            foo.infections = [Spore(genus) for genus in infections]
+            for genus in immune:
+                foo.immunities[genus] = 1.0
+            for genus in half:
+                foo.immunities[genus] = 0.5
+            self.space.enter(2, 3, foo)
+
+        N, stats = self.space.getGenusStats()
+        self.assert_(N == 4)
+        self.assert_(stats['dogs'] == (0.5, 0.25))
+        self.assert_(stats['mice'] == (0.25, 0.5))
+        self.assert_(set(stats) == set(spores.genusNames()))
+
+        # getStats() counts anybody infected, and immune only if not.
+        self.assert_(self.space.getStats('dogs')[:3] == (4, 0.5, 0.25))
+        self.assert_(self.space.getStats('mice')[:3] == (4, 0.5, 0.25))
+        self.space.leave(foo)
+        self.assert_(self.space.getStats('mice')[:3] == (3, 2 / 3.0, 1 / 3.0))
+
+        N, stats = space.Space(10).getGenusStats()
+        self.assert_(N == 0 and stats['dogs'] == (0, 0))
+
+    def test_getDistributions(self):
+        class Spore:
+            def __init__(self, n): self.chain = [None] * n
+        immunities = spores.Immunities()
+        immunities['cats'] = 0.5
+        for foods, infections in ((10, [1, 3]), (150, [3]), (1000, [])):
+            foo = spores.Infectable()
+            foo.foods = foods
+            foo.infections = [Spore(n) for n in infections]
+            foo.immunities.update(immunities)
+            self.space.enter(1, 1, foo)
+        foo.immunities['cats'] = 1.0
+
+        d = self.space.getDistributions()
+        self.assert_(d['population'] == 3)
+        self.assert_(list(d['foods']) == [1, 0, 0, 1, 0, 0, 1])
+        self.assert_(list(d['immunity']) == [0.5, 0.5, 0.5, 0.5, 1.0, 1.0, 1.0])
+        self.assert_(list(d['infections']) == [1, 1, 1])
+        self.assert_(list(d['depths']) == [0, 1, 0, 2])
+
+        d = space.Space(10).getDistributions()
+        self.assert_(d['population'] == 0)
+        self.assert_(list(d['immunity']) == [0.0] * 7)
+        self.failIf(d['depths'])
+
+    def tearDown(self):
+        self.space = None
+
+
+class TestChunkedSpace(unittest.TestCase):
+
+    def setUp(self):
+        self.space = space.ChunkedSpace(100000, 1, chunk_size=16)
+
+    def test_enterLeave(self):
+        self.assert_(self.space.get(99999, 5) is None)
+        foo = Foo()
+        self.space.enter(99999, 5, foo)
+        self.assert_(list(self.space.yieldPeople()) == [foo])
+        self.assert_(self.space is foo.space)
+        self.assert_(len(self.space.chunks) == 1)
+        self.space.leave(foo)
+        self.failIf(list(self.space.yieldPeople()))
+        self.failIf(self.space.chunks)
+
+    def test_yieldNeighbours(self):
+        foo, bar = Foo(), Foo()
+        self.space.enter(15, 15, foo)
+        self.space.enter(16, 17, bar)
+        self.assert_(list(self.space.yieldNeighbours(foo, 2)) == [bar])
+        self.failIf(list(self.space.yieldNeighbours(foo, 1)))
+
+    def test_yieldPeopleOnce(self):
+        foo = Foo()
+        self.space.enter(0, 0, foo)
+        self.space.getOrMake(15, 15).addFood()
+        seen = []
+        for person in self.space.yieldPeople():
+            seen.append(person)
+            self.space.move(3, 3, person)
+        self.assert_(seen == [foo])
+
+    def test_getOutside(self):
+        self.space.enter(0, 99999, Foo())
+        self.assert_(self.space.get(0, 99999) is not None)
+        self.assert_(self.space.get(16, -1) is None)
+        self.assert_(self.space.get(100000, 15) is None)
+
+    def test_moveAcrossChunks(self):
+        foo = Foo()
+        self.space.enter(0, 0, foo)
+        self.space.move(-1, 17, foo)
+        self.assert_(self.space.occupants[foo].coords == (99999, 17))
+        self.assert_(self.space.get(0, 0) is None)
+        self.assert_(len(self.space.chunks) == 1)
+
+    def test_food(self):
+        location = self.space.getOrMake(20, 20)
+        location.addFood(2)
+        self.assert_(self.space.get(20, 20).food.amount == 2)
+        self.assert_(str(self.space.get(20, 20)) == 'f')
+        self.assert_(self.space.within(22, 22, 2) == [location])
+        self.failIf(self.space.within(23, 23, 2))
+        self.assert_(location.eat(3) == 2)
+        self.assert_(location.food is None)
+        self.failIf(self.space.chunks)
+
+    def test_liveCells(self):
+        space_ = space.ChunkedSpace(20, 1, chunk_size=4)
+        people = [Foo() for _ in range(10)]
+        random.seed(5)
+        for person in people:
+            space_.enter(random.randrange(20), random.randrange(20), person)
+        for _ in range(200):
+            space_.generate()
+            for person in people:
+                space_.move(random.choice((-1, 0, 1)), 1, person)
+                space_.forage(person)
+            for chunk in space_.chunks.itervalues():
+                cells = [i for i in range(16) if chunk.food[i] or chunk.count[i]]
+                self.assert_(chunk.liveCells() == cells)
+
+    def test_generate(self):
+        for _ in range(100):
+            self.space.generate()
+        N, infected, immune, fud = self.space.getStats()
+        self.assert_(fud == 100)
+
     def tearDown(self):
         self.space = None
 
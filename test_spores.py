@@ -46,5 +46,103 @@ class TestSpawner(unittest.TestCase):
         spores.Spawner('genus', npc, DummySpore)
 
 
+class TestImmunities(unittest.TestCase):
+
+    def test_genusId(self):
+        gid = spores.genusId('test-genus')
+        self.assert_(spores.genusId('test-genus') == gid)
+        self.assert_(spores.genusNames()[gid] == 'test-genus')
+
+    def test_levels(self):
+        person = spores.Infectable()
+        spore = spores.Spore('test-genus')
+        self.assert_(person.susceptibilityTo('test-genus') == 1.0)
+        self.assert_('test-genus' not in person.immunities)
+
+        person.buildResistance(spore)
+        self.assert_(person.immunities['test-genus'] == 0.01)
+        self.assert_(person.immunities == {'test-genus': 0.01})
+        self.assert_(person.susceptibilityTo(spore.genus_id) == 0.99)
+
+        person.infection(spore)
+        self.assert_(person.infections == [spore])
+        self.assert_(person.immunities.get('test-genus') == 1.0)
+        self.assert_(person.susceptibilityTo('test-genus') == 0.0)
+
+        other = spores.Infectable()
+        other.immunities.update(person.immunities)
+        self.assert_(other.immunities == person.immunities)
+
+
+class Person(spores.Infectable):
+    pass
+
+
+class TestTitheLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.author, self.vector, self.payer = Person(), Person(), Person()
+        self.payer.foods = 200
+        self.chain = spores._appendWeakref([], self.author)
+        spores._appendWeakref(self.chain, self.vector)
+        self.ledger = spores.TitheLedger()
+
+    def test_settle(self):
+        for _ in range(2):
+            self.ledger.tithe(self.payer, self.chain)
+        self.assert_(self.payer.foods == 200)
+        flows = self.ledger.settle()
+        self.assert_(self.payer.foods == 160)
+        # Per tithe: one each as ancestors, 14 plus four unclaimed shares.
+        self.assert_(self.vector.foods == 102)
+        self.assert_(self.author.foods == 100 + 2 * (1 + 14 + 4))
+        self.assert_(flows == dict(
+            tithes=2, paid=40, ancestors=4, authors=36, forfeited=0))
+        self.failIf(self.ledger.pending)
+
+    def test_deadAuthor(self):
+        self.ledger.tithe(self.payer, self.chain)
+        del self.author
+        self.assert_(self.ledger.settle()['forfeited'] == 20)
+        self.assert_(self.payer.foods == 200)
+        self.assert_(self.vector.foods == 100)
+
+    def test_deadAncestor(self):
+        self.ledger.tithe(self.payer, self.chain)
+        del self.vector
+        flows = self.ledger.settle()
+        self.assert_(self.author.foods == 100 + 1 + 14 + 5)
+        self.assert_(flows['ancestors'] == 1)
+
+    def test_derefOnce(self):
+        calls = []
+        class Ref:
+            def __init__(self, person):
+                self.person = person
+            def __call__(self):
+                calls.append(self)
+                return self.person
+        chain = [Ref(self.author), Ref(self.vector)]
+        for _ in range(3):
+            self.ledger.tithe(self.payer, chain)
+        self.failIf(calls)
+        self.ledger.settle()
+        self.assert_(len(calls) == 2)
+        self.assert_(self.payer.foods == 140)
+
+    def test_act(self):
+        spore = spores.Spore('ledger-genus', self.chain)
+        spores.setLedger(self.ledger)
+        try:
+            while not spore.act(self.payer):
+                pass
+        finally:
+            spores.setLedger(None)
+        self.assert_(self.payer.foods == 200)
+        self.ledger.settle()
+        self.assert_(self.payer.foods == 180)
+        self.assert_(self.ledger.totals['tithes'] == 1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+import shutil
+import tempfile
+import unittest
+import cache
+import sweep
+
+
+class TestSettled(unittest.TestCase):
+
+    def test_settled(self):
+        self.assert_(sweep.settled([(10, 0.5, 0.5, 0)]) == 'saturated')
+        self.assert_(sweep.settled([(10, 0.0, 0.2, 0)]) == 'extinct')
+        self.assert_(sweep.settled([(10, 0.1, 0.2, 0)]) is None)
+        series = [(10, 0.1, 0.2, 0)] * 5
+        self.assert_(sweep.settled(series, window=5) == 'steady')
+        series.append((10, 0.2, 0.2, 0))
+        self.assert_(sweep.settled(series, window=5) is None)
+
+    def test_lagPhase(self):
+        # One carrier and nobody immune yet isn't steady, however long
+        # it lasts.
+        series = [(60, 1 / 60.0, 0.0, 0)] * 50
+        self.assert_(sweep.settled(series) is None)
+        series = [(60, 1 / 60.0, 1 / 60.0, 0)] * 25
+        self.assert_(sweep.settled(series) == 'steady')
+        series.append((60, 2 / 60.0, 1 / 60.0, 0))
+        self.assert_(sweep.settled(series) is None)
+        self.assert_(sweep.settled(series, tolerance=1) == 'steady')
+
+
+class TestAdaptiveSweep(unittest.TestCase):
+
+    def test_run(self):
+        configs = [
+            dict(dimension=15, number_of_npcs=5, virulence=0.0),
+            dict(dimension=15, number_of_npcs=5, virulence=0.5),
+            ]
+        s = sweep.AdaptiveSweep(configs, budget=200, replicates=2, max_steps=50)
+        results = s.run()
+        self.assert_(s.spent == 200)
+        self.assert_(sum(steps for r in results for o, steps, why in r) == 200)
+        self.assert_(all(len(r) >= 2 for r in results))
+        self.assert_(len(s.summary()) == 2)
+
+    def test_setupSim(self):
+        # The standard scenario spends well over a window with one
+        # carrier and nobody immune; those runs mustn't stop early.
+        configs = [{}]
+        s = sweep.AdaptiveSweep(configs, budget=240, replicates=4, max_steps=60)
+        s.run()
+        self.assert_([steps for o, steps, why in s.results[0]] == [60] * 4)
+        self.assert_(all(why is None for o, steps, why in s.results[0]))
+
+    def test_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            configs = [
+                dict(dimension=15, number_of_npcs=5, virulence=0.0),
+                dict(dimension=15, number_of_npcs=5, virulence=0.5),
+                ]
+            fresh = sweep.AdaptiveSweep(configs, budget=200, max_steps=30)
+            fresh.run()
+
+            runs = cache.RunCache(directory)
+            for _ in range(2):
+                s = sweep.AdaptiveSweep(
+                    configs, budget=200, max_steps=30, cache=runs)
+                s.run()
+                self.assert_(s.results == fresh.results)
+            replicates = sum(len(r) for r in s.results)
+            self.assert_(runs.hits + runs.misses == 2 * replicates)
+            # All but the replicate cut short by the budget came back.
+            self.assert_(runs.hits == replicates - 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_budget(self):
+        configs = [dict(dimension=15, number_of_npcs=5, virulence=0.0)]
+        s = sweep.AdaptiveSweep(
+            configs, budget=5, replicates=1, max_steps=50, window=100)
+        s.run()
+        self.assert_(s.results == [[(s.results[0][0][0], 5, 'budget')]])
+        self.assert_(s.summary() == [(0, 0.0, 0.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
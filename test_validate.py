@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import os
+import random
+import unittest
+import sbonu
+import space
+import validate
+
+
+class TestKS(unittest.TestCase):
+
+    def test_ks_2samp(self):
+        d, p = validate.ks_2samp(range(50), range(50))
+        self.assert_(d == 0.0 and p == 1.0)
+        d, p = validate.ks_2samp(range(50), range(100, 150))
+        self.assert_(d == 1.0 and p < 1e-6)
+        d, p = validate.ks_2samp([1, 2, 3, 4], [3, 4, 5, 6])
+        self.assert_(d == 0.5)
+
+
+class BatchScheduler(sbonu.ActivityScheduler):
+    # Moves idle wanderers after everybody else has had their turn, which
+    # subtly changes the dynamics (fewer survivors by step 150.)
+
+    def iterStep(self, sim):
+        space = sim.space
+        idle = []
+        for person in space.yieldPeople():
+            if self.classify(space, person) is self.IDLE:
+                idle.append(person)
+            else:
+                sim.runProgram(person)
+            yield
+        for person in idle:
+            if person.space is not space:
+                continue
+            if person.infections:
+                sim.runProgram(person)
+            elif person.foods <= 0:
+                sim.starve(person)
+            else:
+                dx, dy = random.choice(sbonu._spots)
+                person.foods -= space.move(dx, dy, person)
+
+
+class TestCompare(unittest.TestCase):
+
+    params = dict(dimension=15, number_of_npcs=20, food_growth_rate=10)
+
+    def test_sameDynamics(self):
+        report = validate.compare(
+            validate.engine(**self.params),
+            validate.engine(
+                space_class=space.ChunkedSpace,
+                scheduler_factory=sbonu.ActivityScheduler,
+                **self.params),
+            seeds=range(20), steps=40, checkpoints=(20, 40))
+        self.assert_(len(report) == 9)
+        self.failIf(validate.diverged(report))
+
+    def test_differentDynamics(self):
+        report = validate.compare(
+            validate.engine(virulence=0.0, **self.params),
+            validate.engine(virulence=1.0, **self.params),
+            seeds=range(12), steps=30, checkpoints=(30,))
+        self.assert_('infected@30' in validate.diverged(report))
+
+
+# Telling subtle divergences apart takes about a minute of runs,
+# so these only run with SBONU_SLOW_TESTS set in the environment:
+#
+#     SBONU_SLOW_TESTS=1 python -m unittest test_validate
+@unittest.skipUnless(os.environ.get('SBONU_SLOW_TESTS'), 'slow')
+class TestCompareSlow(unittest.TestCase):
+
+    params = dict(dimension=30, number_of_npcs=60, food_growth_rate=20)
+    seeds = range(50)
+    steps = 150
+    checkpoints = (150,)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reference = validate.observeAll(
+            validate.engine(**cls.params), cls.seeds, cls.steps, cls.checkpoints)
+
+    def compare(self, **kw):
+        candidate = validate.observeAll(
+            validate.engine(**dict(self.params, **kw)),
+            [seed + len(self.seeds) for seed in self.seeds],
+            self.steps,
+            self.checkpoints,
+            )
+        return validate.report(self.reference, candidate, alpha=0.001)
+
+    def test_sameDynamics(self):
+        report = self.compare(
+            space_class=space.ChunkedSpace,
+            scheduler_factory=sbonu.ActivityScheduler,
+            )
+        self.assert_(len(report) == 5)
+        self.failIf(validate.diverged(report))
+
+    def test_subtleDivergence(self):
+        report = self.compare(scheduler_factory=BatchScheduler)
+        self.assert_('population@150' in validate.diverged(report))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from multiprocessing import Process
+import workqueue
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue = workqueue.WorkQueue(self.directory, lease_timeout=5)
+        self.jobs = [
+            dict(dimension=15, number_of_npcs=5, seed=seed, steps=10)
+            for seed in range(6)
+            ]
+
+    def test_workers(self):
+        ids = self.queue.submit(self.jobs)
+        workers = [
+            Process(target=workqueue.work, args=(self.directory, 5))
+            for _ in range(3)
+            ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assert_(self.queue.status() == (0, 0, 6))
+        results = self.queue.merge()
+        self.assert_(sorted(results) == ids)
+        for id, job in zip(ids, self.jobs):
+            self.assert_(results[id][0] == job)
+            self.assert_(results[id][1] == workqueue.runJob(job))
+
+    def test_cache(self):
+        cache_directory = os.path.join(self.directory, 'cache')
+        ids = self.queue.submit(self.jobs[:2])
+        workqueue.work(self.directory, 5, cache_directory=cache_directory)
+        results = self.queue.merge()
+        runs = workqueue.RunCache(cache_directory)
+        for id, job in zip(ids, self.jobs):
+            self.assert_(results[id][1] == workqueue.runJob(job, runs))
+        self.assert_(runs.hits == 2 and not runs.misses)
+
+    def test_expiry(self):
+        self.queue.submit(self.jobs[:1])
+        id, job = self.queue.claim()
+        self.assert_(self.queue.claim() is None)
+
+        old = time.time() - 60
+        os.utime(os.path.join(self.directory, 'leases', id + '.job'), (old, old))
+        self.assert_(self.queue.claim() == (id, job))
+        self.assert_(self.queue.heartbeat(id))
+
+        self.queue.complete(id, job, 'result')
+        self.failIf(self.queue.heartbeat(id))
+        self.assert_(self.queue.status() == (0, 0, 1))
+
+    def test_lostLease(self):
+        ids = self.queue.submit(self.jobs[:2])
+        read = self.queue._read
+        def lose(path):
+            # Somebody reclaims the first lease right after we take it.
+            self.queue._read = read
+            os.remove(path)
+            return read(path)
+        self.queue._read = lose
+        self.assert_(self.queue.claim()[0] == ids[1])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
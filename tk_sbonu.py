@@ -1,12 +1,13 @@
 #!/usr/bin/env python
 from Tkinter import *
-import bonus
+from sbonu import DIMENSION
+from space import Space
 import math
 
 
-_R = list(range(bonus.DIMENSION))
+_R = list(range(DIMENSION))
 SCALE = 10
-DIM = bonus.DIMENSION * SCALE
+DIM = DIMENSION * SCALE
 
 
 class TkBonus:
@@ -61,22 +62,26 @@ class TkBonus:
 
 
 
+def main():
+    root = Tk()
+    root.title('Tk-bonus')
+    canvas = Canvas(
+        root,
+        height=DIM,
+        width=DIM,
+        background='brown',
+        )
+    canvas.pack(expand=True, fill=BOTH)
 
-root = Tk()
-root.title('Tk-bonus')
-canvas = Canvas(
-    root,
-    height=DIM,
-    width=DIM,
-    background='brown',
-    )
-canvas.pack(expand=True, fill=BOTH)
+    space = Space(DIMENSION)
+    space.generate()
+    space.generate()
+    space.generate()
+    print space
 
-space = bonus.Space()
-space.generate()
-space.generate()
-space.generate()
-print space
+    tkb = TkBonus(canvas, space)
+    root.mainloop()
 
-tkb = TkBonus(canvas, space)
-root.mainloop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+'''
+
+validate.py - Differential validation of alternative simulation engines.
+
+Faster engines (ChunkedSpace, numba kernels, ...) visit people or draw
+random numbers in a different order than the reference engine, so their
+runs can't be compared step for step.  Instead this runs both engines
+over many seeds and compares the distributions of what the runs look
+like -- population, infected, immune and food at checkpoint steps, plus
+the time to saturation -- with two-sample Kolmogorov-Smirnov tests.  The
+two engines are run on different seeds, so that the samples are
+independent.
+
+An engine is a callable taking a seed and returning a fresh simulation,
+for example:
+
+    reference = engine()
+    chunked = engine(
+        space_class=ChunkedSpace, scheduler_factory=ActivityScheduler)
+
+    for row in compare(reference, chunked, seeds=range(40)):
+        print row
+
+'''
+import random
+from math import exp, sqrt
+
+import sbonu
+
+
+FIELDS = ('population', 'infected', 'immune', 'food')
+
+
+def engine(**kw):
+    '''
+    Return an engine running setup_sim(**kw).  (Anything that needs to
+    be fresh per run, like a scheduler, can be given as a zero argument
+    callable ending in "_factory", e.g. scheduler_factory.)
+    '''
+    def make(seed):
+        params = {}
+        for name, value in kw.items():
+            if name.endswith('_factory'):
+                params[name[:-len('_factory')]] = value()
+            else:
+                params[name] = value
+        random.seed(seed)
+        Alice, S, sim = sbonu.setup_sim(**params)
+        return sim
+    return make
+
+
+def observe(sim, steps, checkpoints):
+    '''
+    Run sim for steps steps and return a dict of the observations of the
+    run: each stats field at each checkpoint step and the time to
+    saturation (steps, if it never saturates.)  A run that saturates
+    early holds its final stats for the remaining checkpoints.
+    '''
+    observations = {}
+    saturation = steps
+    stats = sim.space.getStats()
+    for n in xrange(1, steps + 1):
+        if saturation == steps:
+            sim.step()
+            stats = sim.space.getStats()
+            pop, infected, immune, fud = stats
+            if infected + immune >= 1.0:
+                saturation = n
+        if n in checkpoints:
+            for field, value in zip(FIELDS, stats):
+                observations['%s@%i' % (field, n)] = value
+    observations['saturation'] = saturation
+    return observations
+
+
+def ks_2samp(a, b):
+    '''
+    Two-sample Kolmogorov-Smirnov test, return (D, p-value).  The
+    p-value uses the asymptotic Kolmogorov distribution.
+    '''
+    a = sorted(a)
+    b = sorted(b)
+    n, m = len(a), len(b)
+    i = j = 0
+    d = 0.0
+    while i < n and j < m:
+        value = min(a[i], b[j])
+        while i < n and a[i] == value:
+            i += 1
+        while j < m and b[j] == value:
+            j += 1
+        d = max(d, abs(float(i) / n - float(j) / m))
+
+    en = sqrt(n * m / float(n + m))
+    return d, kolmogorov((en + 0.12 + 0.11 / en) * d)
+
+
+def kolmogorov(x):
+    '''
+    Return the survival function of the Kolmogorov distribution at x.
+    '''
+    if x < 0.27:
+        return 1.0
+    total = 0.0
+    for k in range(1, 101):
+        term = 2 * (-1) ** (k - 1) * exp(-2 * k * k * x * x)
+        total += term
+        if abs(term) < 1e-12:
+            break
+    return max(0.0, min(1.0, total))
+
+
+def compare(
+    reference,
+    candidate,
+    seeds=range(30),
+    steps=150,
+    checkpoints=(25, 50, 100, 150),
+    alpha=0.01,
+    candidate_seeds=None,
+    ):
+    '''
+    Run reference over seeds and candidate over candidate_seeds (by
+    default as many again, following on from seeds) and return a report:
+    a list of (name, D, p-value, diverged) rows, one per observation,
+    where diverged means the distributions differ at significance alpha.
+    '''
+    if candidate_seeds is None:
+        first = max(seeds) + 1
+        candidate_seeds = range(first, first + len(seeds))
+    return report(
+        observeAll(reference, seeds, steps, checkpoints),
+        observeAll(candidate, candidate_seeds, steps, checkpoints),
+        alpha,
+        )
+
+
+def observeAll(make, seeds, steps, checkpoints):
+    '''
+    Return the list of observe() dicts of engine make's runs over seeds.
+    '''
+    checkpoints = set(checkpoints)
+    return [observe(make(seed), steps, checkpoints) for seed in seeds]
+
+
+def report(reference_runs, candidate_runs, alpha=0.01):
+    '''
+    Return the compare() report for two lists of observeAll() dicts.
+    '''
+    rows = []
+    for name in sorted(reference_runs[0]):
+        d, p = ks_2samp(
+            [observations[name] for observations in reference_runs],
+            [observations[name] for observations in candidate_runs],
+            )
+        rows.append((name, d, p, p < alpha))
+    return rows
+
+
+def diverged(report):
+    '''
+    Return the names of the observations that diverged in report.
+    '''
+    return [name for name, d, p, bad in report if bad]
+
+
+def printReport(report):
+    for name, d, p, bad in report:
+        print '%-16s D=%.03f p=%.04f%s' % (name, d, p, '  DIVERGED' if bad else '')
@@ -0,0 +1,252 @@
+'''
+
+workqueue.py - Resumable sweep queue on a shared filesystem.
+
+Several worker processes, on any hosts that share the queue directory,
+drain one queue of simulation runs.  Everything is coordinated with
+atomic renames, so no external services are needed:
+
+    todo/ID.job     waiting runs
+    leases/ID.job   runs being worked on, claimed by renaming from todo/
+                    and kept alive by their worker touching the file
+    done/ID.result  finished runs
+
+A lease that hasn't been touched for lease_timeout seconds belongs to a
+dead worker and is renamed back into todo/ for someone else.  Workers
+can join or leave at any time; merge() collects the results at the end.
+
+A job is a dict of setup_sim() keyword arguments plus 'seed' and
+'steps'; its result is the stats series of the run.  Workers can share
+a RunCache directory too, so a run that any of them has done before
+isn't done again.
+
+'''
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import cPickle as pickle
+from functools import partial
+from uuid import uuid4
+
+import sbonu
+from cache import RunCache
+
+
+TODO, LEASES, DONE = 'todo', 'leases', 'done'
+
+
+def runJob(job, cache=None):
+    '''
+    Run a job, return its stats series.  With a RunCache, seeded jobs
+    are looked up in (and added to) the cache.
+    '''
+    params = dict(job)
+    seed = params.pop('seed', None)
+    steps = params.pop('steps', 500)
+    if cache is not None and seed is not None:
+        return cache.run(seed, steps, **params)
+    random.seed(seed)
+    Alice, S, sim = sbonu.setup_sim(**params)
+    return sim.run(steps)
+
+
+class WorkQueue:
+    '''
+    A queue of jobs in directory.
+    '''
+
+    def __init__(self, directory, lease_timeout=60.0):
+        self.directory = directory
+        self.lease_timeout = lease_timeout
+        for name in (TODO, LEASES, DONE):
+            path = os.path.join(directory, name)
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    if not os.path.isdir(path): # Lost a race is fine.
+                        raise
+
+    def _path(self, state, id, suffix='.job'):
+        return os.path.join(self.directory, state, id + suffix)
+
+    def _ids(self, state):
+        return sorted(
+            name.rsplit('.', 1)[0]
+            for name in os.listdir(os.path.join(self.directory, state))
+            if not name.startswith('.')
+            )
+
+    def _write(self, path, obj):
+        # Write obj to path atomically.
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp, path)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def submit(self, jobs):
+        '''
+        Add jobs to the queue, return their ids.
+        '''
+        batch = uuid4().hex[:8]
+        ids = []
+        for n, job in enumerate(jobs):
+            id = '%s-%06i' % (batch, n)
+            self._write(self._path(TODO, id), job)
+            ids.append(id)
+        return ids
+
+    def reclaim(self):
+        '''
+        Put expired leases back in todo/, return how many.
+        '''
+        n = 0
+        now = time.time()
+        for id in self._ids(LEASES):
+            lease = self._path(LEASES, id)
+            try:
+                expired = now - os.stat(lease).st_mtime > self.lease_timeout
+                if expired:
+                    os.rename(lease, self._path(TODO, id))
+                    n += 1
+            except OSError:
+                pass # Finished or reclaimed by someone else.
+        return n
+
+    def claim(self):
+        '''
+        Lease a job, return (id, job) or None if there's nothing to do.
+        '''
+        self.reclaim()
+        for id in self._ids(TODO):
+            todo = self._path(TODO, id)
+            lease = self._path(LEASES, id)
+            try:
+                # Touch first: rename() keeps the submit time, which would
+                # make the new lease look expired to other workers.
+                os.utime(todo, None)
+                os.rename(todo, lease)
+            except OSError:
+                continue # Somebody else got it.
+            try:
+                os.utime(lease, None)
+                if os.path.exists(self._path(DONE, id, '.result')):
+                    # Finished by a worker we thought was dead.
+                    self._release(id)
+                    continue
+                return id, self._read(lease)
+            except (IOError, OSError):
+                continue # Lost the lease already, try the next job.
+        return None
+
+    def heartbeat(self, id):
+        '''
+        Keep the lease on id alive, return False if it has been lost.
+        '''
+        try:
+            os.utime(self._path(LEASES, id), None)
+            return True
+        except OSError:
+            return False
+
+    def complete(self, id, job, result):
+        '''
+        Store the result of job id and give up its lease.
+        '''
+        self._write(self._path(DONE, id, '.result'), (job, result))
+        self._release(id)
+
+    def _release(self, id):
+        try:
+            os.remove(self._path(LEASES, id))
+        except OSError:
+            pass
+
+    def status(self):
+        '''
+        Return the number of (waiting, leased, done) jobs.
+        '''
+        return tuple(len(self._ids(state)) for state in (TODO, LEASES, DONE))
+
+    def merge(self):
+        '''
+        Return a dict mapping id to (job, result) for all finished jobs.
+        '''
+        return dict(
+            (id, self._read(self._path(DONE, id, '.result')))
+            for id in self._ids(DONE)
+            )
+
+
+class Worker:
+    '''
+    Claim and run jobs from queue until there are none left, touching the
+    lease every heartbeat seconds while a job runs.
+    '''
+
+    def __init__(self, queue, heartbeat=None, run=runJob):
+        self.queue = queue
+        if heartbeat is None:
+            heartbeat = queue.lease_timeout / 4.0
+        self.heartbeat = heartbeat
+        self.runJob = run
+        self.name = '%s:%i' % (socket.gethostname(), os.getpid())
+        self.completed = 0
+
+    def _beat(self, id, done):
+        while not done.wait(self.heartbeat):
+            self.queue.heartbeat(id)
+
+    def runOne(self):
+        '''
+        Claim and run one job, return False if there was none.
+        '''
+        claimed = self.queue.claim()
+        if claimed is None:
+            return False
+        id, job = claimed
+
+        done = threading.Event()
+        beat = threading.Thread(target=self._beat, args=(id, done))
+        beat.daemon = True
+        beat.start()
+        try:
+            result = self.runJob(job)
+        finally:
+            done.set()
+            beat.join()
+
+        self.queue.complete(id, job, result)
+        self.completed += 1
+        return True
+
+    def run(self, wait=False, poll=1.0):
+        '''
+        Run jobs until the queue is empty.  With wait, keep polling until
+        other workers' leases are finished too (in case one dies.)
+        '''
+        while True:
+            if self.runOne():
+                continue
+            waiting, leased, done = self.queue.status()
+            if not (wait and leased):
+                return self.completed
+            time.sleep(poll)
+
+
+def work(directory, lease_timeout=60.0, wait=True, cache_directory=None):
+    '''
+    Run a worker on the queue in directory (e.g. as a process target),
+    with a RunCache in cache_directory if it's given.
+    '''
+    run = runJob
+    if cache_directory is not None:
+        run = partial(runJob, cache=RunCache(cache_directory))
+    return Worker(WorkQueue(directory, lease_timeout), run=run).run(wait)